@@ -1,38 +1,61 @@
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector import pooling
 from app.config.settings import settings
 from typing import Optional, Dict, Any, List
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _connection_config() -> Dict[str, Any]:
+    return {
+        "host": settings.DB_HOST,
+        "user": settings.DB_USER,
+        "password": settings.DB_PASSWORD,
+        "database": settings.DB_NAME,
+        "port": settings.DB_PORT
+    }
+
+def init_db_pool() -> None:
+    """Open the connection pool (all DB_POOL_SIZE connections) ahead of the first request"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="agent_service",
+                pool_size=settings.DB_POOL_SIZE,
+                pool_reset_session=True,
+                **_connection_config()
+            )
 
 def get_db_connection():
-    """Create and return a MySQL database connection"""
+    """Return a pooled MySQL connection; close() hands it back to the pool"""
     try:
-        connection = mysql.connector.connect(
-            host=settings.DB_HOST,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            database=settings.DB_NAME,
-            port=settings.DB_PORT
-        )
-        return connection
+        if settings.DB_POOL_SIZE > 0:
+            if _pool is None:
+                init_db_pool()
+            try:
+                return _pool.get_connection()
+            except pooling.PoolError:
+                # Pool exhausted: fall back to a one-off connection rather than fail
+                pass
+        return mysql.connector.connect(**_connection_config())
     except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+        logger.error("Error connecting to MySQL: %s", e)
         raise
 
-def get_booking_details(booking_id: int) -> Optional[Dict[str, Any]]:
-    """Fetch booking details from database"""
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        query = """
+_BOOKING_DETAILS_QUERY = """
         SELECT 
             b.id,
             b.start_date,
             b.end_date,
             b.num_guests,
             b.status,
+            b.traveler_id,
             p.name as property_name,
             p.city,
             p.state,
@@ -44,22 +67,33 @@ def get_booking_details(booking_id: int) -> Optional[Dict[str, Any]]:
         FROM bookings b
         JOIN properties p ON b.property_id = p.id
         JOIN users u ON b.traveler_id = u.id
-        WHERE b.id = %s
         """
+
+def _parse_amenities(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse amenities if it's a string"""
+    if result and 'amenities' in result and isinstance(result['amenities'], str):
+        try:
+            import json
+            result['amenities'] = json.loads(result['amenities'])
+        except:
+            result['amenities'] = result['amenities'].split(',') if result['amenities'] else []
+    return result
+
+def get_booking_details(booking_id: int) -> Optional[Dict[str, Any]]:
+    """Fetch booking details from database"""
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        query = _BOOKING_DETAILS_QUERY + "WHERE b.id = %s"
         cursor.execute(query, (booking_id,))
         result = cursor.fetchone()
         
-        # Parse amenities if it's a string
-        if result and 'amenities' in result and isinstance(result['amenities'], str):
-            try:
-                import json
-                result['amenities'] = json.loads(result['amenities'])
-            except:
-                result['amenities'] = result['amenities'].split(',') if result['amenities'] else []
-        
-        return result
+        return _parse_amenities(result)
     except Error as e:
-        print(f"Error fetching booking details: {e}")
+        logger.error("Error fetching booking details: %s", e)
         return None
     finally:
         if cursor:
@@ -67,6 +101,58 @@ def get_booking_details(booking_id: int) -> Optional[Dict[str, Any]]:
         if conn:
             conn.close()
 
+def get_bookings_details(booking_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Fetch details for many bookings in one query, keyed by booking id"""
+    if not booking_ids:
+        return {}
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        ids = sorted(set(booking_ids))
+        placeholders = ", ".join(["%s"] * len(ids))
+        query = _BOOKING_DETAILS_QUERY + f"WHERE b.id IN ({placeholders})"
+        cursor.execute(query, tuple(ids))
+        
+        return {row['id']: _parse_amenities(row) for row in cursor.fetchall()}
+    except Error as e:
+        logger.error("Error fetching booking details: %s", e)
+        return {}
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def get_upcoming_booking_ids(days_ahead: int, status: str = 'accepted') -> List[int]:
+    """Fetch ids of bookings with the given status starting within the next days_ahead days"""
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        query = """
+        SELECT b.id
+        FROM bookings b
+        WHERE b.status = %s
+          AND b.start_date >= CURDATE()
+          AND b.start_date < CURDATE() + INTERVAL %s DAY
+        ORDER BY b.start_date, b.id
+        """
+        cursor.execute(query, (status, days_ahead))
+        return [row['id'] for row in cursor.fetchall()]
+    except Error as e:
+        logger.error("Error fetching upcoming bookings: %s", e)
+        return []
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
 def get_user_preferences(user_id: int) -> Optional[Dict[str, Any]]:
     """Fetch user preferences from database"""
     conn = None
@@ -88,7 +174,7 @@ def get_user_preferences(user_id: int) -> Optional[Dict[str, Any]]:
         cursor.execute(query, (user_id,))
         return cursor.fetchone()
     except Error as e:
-        print(f"Error fetching user preferences: {e}")
+        logger.error("Error fetching user preferences: %s", e)
         return None
     finally:
         if cursor:
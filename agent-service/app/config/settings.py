@@ -16,20 +16,93 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = os.getenv('DB_PASSWORD', '')
     DB_NAME: str = os.getenv('DB_NAME', 'hostly_db')
     DB_PORT: int = int(os.getenv('DB_PORT', 3306))
+    DB_POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', 5))
+    
+    # Plan storage
+    PLAN_STORE_BACKEND: str = os.getenv('PLAN_STORE_BACKEND', 'memory')  # memory, mysql, mongo, none
+    PLAN_TTL_SECONDS: int = int(os.getenv('PLAN_TTL_SECONDS', 7 * 24 * 3600))
+    PLAN_MEMORY_MAX_ENTRIES: int = int(os.getenv('PLAN_MEMORY_MAX_ENTRIES', 10000))  # memory backend only
+    MONGODB_URI: str = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+    MONGODB_DB: str = os.getenv('MONGODB_DB', 'hostly')
     
     # Server
     HOST: str = os.getenv('HOST', '0.0.0.0')
     PORT: int = int(os.getenv('PORT', 8000))
     DEBUG: bool = os.getenv('DEBUG', 'True').lower() == 'true'
+    COMPRESSION_MIN_SIZE: int = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+    WARMUP_TIMEOUT_SECONDS: float = float(os.getenv('WARMUP_TIMEOUT_SECONDS', 10))
+    
+    # Deadlines (seconds); callers may send X-Request-Timeout instead
+    DEADLINE_DEFAULT_SECONDS: float = float(os.getenv('DEADLINE_DEFAULT_SECONDS', 30))
+    DEADLINE_MAX_SECONDS: float = float(os.getenv('DEADLINE_MAX_SECONDS', 600))
+    DEADLINE_ROUTE_SECONDS: str = os.getenv('DEADLINE_ROUTE_SECONDS', '{"/api/agent/generate-plan": 60, "/api/agent/generate-plans/batch": 600, "/api/agent/booking/{booking_id}/details": 5}')
+    DB_TIMEOUT_SECONDS: float = float(os.getenv('DB_TIMEOUT_SECONDS', 5))
+    SEARCH_TIMEOUT_SECONDS: float = float(os.getenv('SEARCH_TIMEOUT_SECONDS', 20))
+    
+    # Adaptive upstream timeouts: percentile x multiplier of recent latencies, clamped per operation
+    ADAPTIVE_TIMEOUT_PERCENTILE: float = float(os.getenv('ADAPTIVE_TIMEOUT_PERCENTILE', 99))
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = float(os.getenv('ADAPTIVE_TIMEOUT_MULTIPLIER', 1.5))
+    ADAPTIVE_TIMEOUT_WINDOW: int = int(os.getenv('ADAPTIVE_TIMEOUT_WINDOW', 200))
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES: int = int(os.getenv('ADAPTIVE_TIMEOUT_MIN_SAMPLES', 20))
+    UPSTREAM_TIMEOUT_BOUNDS: str = os.getenv('UPSTREAM_TIMEOUT_BOUNDS', '')  # {"llm.itinerary": [10, 60], ...}
+    UPSTREAM_MAX_RETRIES: int = int(os.getenv('UPSTREAM_MAX_RETRIES', 1))
+    
+    # Logging
+    LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT: str = os.getenv('LOG_FORMAT', 'json')  # json or text
+    LOG_QUEUE_SIZE: int = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_SAMPLE_RATES: str = os.getenv('LOG_SAMPLE_RATES', '{}')  # route template -> fraction of requests whose info logs are kept
     
     # CORS
     FRONTEND_URL: str = os.getenv('FRONTEND_URL', 'http://localhost:5173')
     BACKEND_URL: str = os.getenv('BACKEND_URL', 'http://localhost:3000')
     
+    # LLM provider: groq, openai, openai_compatible (self-hosted, set LLM_BASE_URL) or fake
+    LLM_PROVIDER: str = os.getenv('LLM_PROVIDER', 'groq')
+    LLM_MODEL: str = os.getenv('LLM_MODEL', 'llama-3.1-8b-instant')
+    LLM_BASE_URL: str = os.getenv('LLM_BASE_URL', '')
+    LLM_API_KEY: str = os.getenv('LLM_API_KEY', os.getenv('OPENAI_API_KEY', ''))  # Groq historically used OPENAI_API_KEY
+    LLM_STREAM: bool = os.getenv('LLM_STREAM', 'False').lower() == 'true'
+    LLM_JSON_MODE: bool = os.getenv('LLM_JSON_MODE', 'False').lower() == 'true'
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv('LLM_TIMEOUT_SECONDS', 60))
+    LLM_FAKE_LATENCY_MS: float = float(os.getenv('LLM_FAKE_LATENCY_MS', 0))
+    
+    # Web search provider: tavily or fake (deterministic offline results for load tests)
+    SEARCH_PROVIDER: str = os.getenv('SEARCH_PROVIDER', 'tavily')
+    SEARCH_FAKE_LATENCY_MS: float = float(os.getenv('SEARCH_FAKE_LATENCY_MS', 0))
+    
     # Agent
     AGENT_MODEL: str = os.getenv('AGENT_MODEL', 'gpt-4')
     AGENT_TEMPERATURE: float = float(os.getenv('AGENT_TEMPERATURE', 0.7))
     MAX_SEARCH_RESULTS: int = int(os.getenv('MAX_SEARCH_RESULTS', 5))
+    ITINERARY_CHUNK_DAYS: int = int(os.getenv('ITINERARY_CHUNK_DAYS', 3))
+    DISTILL_CHARS_PER_SEARCH: int = int(os.getenv('DISTILL_CHARS_PER_SEARCH', 1500))
+    MAX_CONCURRENT_COMPLETIONS: int = int(os.getenv('MAX_CONCURRENT_COMPLETIONS', 8))
+    BATCH_MAX_ITEMS: int = int(os.getenv('BATCH_MAX_ITEMS', 100))
+    BATCH_MAX_CONCURRENT_PLANS: int = int(os.getenv('BATCH_MAX_CONCURRENT_PLANS', 4))
+    
+    # Caching
+    WEATHER_CACHE_MAX_ENTRIES: int = int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', 20000))
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 5000))
+    SEARCH_CACHE_TTL_SECONDS: int = int(os.getenv('SEARCH_CACHE_TTL_SECONDS', 6 * 3600))
+    
+    # Usage accounting and budgets (USD; a budget of 0 means unlimited)
+    LLM_PRICING: str = os.getenv('LLM_PRICING', '{"llama-3.1-8b-instant": [0.05, 0.08], "llama-3.3-70b-versatile": [0.59, 0.79], "gpt-4o-mini": [0.15, 0.6], "gpt-3.5-turbo": [0.5, 1.5]}')  # model -> [prompt, completion] per 1M tokens
+    TAVILY_COST_PER_CREDIT: float = float(os.getenv('TAVILY_COST_PER_CREDIT', 0.008))
+    BUDGET_USER_DAILY_USD: float = float(os.getenv('BUDGET_USER_DAILY_USD', 0))
+    BUDGET_TENANT_DAILY_USD: float = float(os.getenv('BUDGET_TENANT_DAILY_USD', 0))
+    BUDGET_DOWNGRADE_FRACTION: float = float(os.getenv('BUDGET_DOWNGRADE_FRACTION', 0.8))
+    LLM_DOWNGRADE_MODEL: str = os.getenv('LLM_DOWNGRADE_MODEL', '')
+    ADMIN_TOKEN: str = os.getenv('ADMIN_TOKEN', '')  # /admin/usage is refused while unset
+    GATEWAY_TOKEN: str = os.getenv('GATEWAY_TOKEN', '')  # X-User-Id / X-Tenant-Id are only trusted with this
+    
+    # Prefetch (speculative work when booking details are viewed)
+    PREFETCH_ENABLED: bool = os.getenv('PREFETCH_ENABLED', 'False').lower() == 'true'
+    PREFETCH_DRAFT_PLAN: bool = os.getenv('PREFETCH_DRAFT_PLAN', 'False').lower() == 'true'
+    PREFETCH_TTL_SECONDS: int = int(os.getenv('PREFETCH_TTL_SECONDS', 900))
+    PREFETCH_MAX_INFLIGHT: int = int(os.getenv('PREFETCH_MAX_INFLIGHT', 4))
+    PREFETCH_DEFAULT_BUDGET: str = os.getenv('PREFETCH_DEFAULT_BUDGET', 'medium')
+    PREFETCH_DEFAULT_INTERESTS: str = os.getenv('PREFETCH_DEFAULT_INTERESTS', 'sightseeing,food')  # comma-separated
     
     @property
     def CORS_ORIGINS(self) -> List[str]:
@@ -0,0 +1,341 @@
+"""
+Precompute travel plans for upcoming confirmed bookings.
+
+Scans bookings starting within --days-ahead days, builds the same prompts as
+TravelAgentService, completes them through the provider batch API when one is
+available (or a concurrency-limited interactive path otherwise) and writes the
+finished plans to plan storage.
+
+The run is resumable and idempotent: progress lives in a JSON state file, and
+bookings whose plan is already in the repository are skipped. Plans must go to a
+persistent store (PLAN_STORE_BACKEND=mysql or mongo); the job refuses to run
+against the in-memory or disabled store.
+
+Usage (from agent-service/):
+    python -m app.jobs.prewarm --days-ahead 7 --interests food,museums
+    PLAN_STORE_BACKEND=mysql python -m app.jobs.prewarm --provider fake --state-file /tmp/prewarm.json
+"""
+
+from app.config.settings import settings
+from app.config.database import get_upcoming_booking_ids, get_bookings_details
+from app.models.schemas import AgentRequest, BookingContext, PlanJobs, TravelPreferences
+from app.providers.llm import fake_completion
+from app.repositories.plan_repository import plan_repository, plan_fingerprint
+from app.services.agent_service import travel_agent_service
+from app.services.usage_service import usage_tracker
+from app.utils.serialization import dumps
+from app.utils.log import setup_logging
+from typing import Any, Dict, List, Optional
+from abc import ABC, abstractmethod
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+class BatchBackend(ABC):
+    """Completes chat requests keyed by custom_id.
+    
+    Every backend completes requests directly; those with supports_batch also
+    override submit and poll with an asynchronous batch API.
+    """
+    supports_batch = False
+    
+    @abstractmethod
+    async def complete(self, bodies: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """Complete requests directly (used when no batch API is available)"""
+    
+    async def submit(self, bodies: Dict[str, Dict[str, Any]]) -> str:
+        """Submit an asynchronous batch and return its id"""
+        raise NotImplementedError(f"{type(self).__name__} has no batch API")
+    
+    async def poll(self, batch_id: str) -> Optional[Dict[str, str]]:
+        """Return {custom_id: content} once the batch has ended, None while it is running"""
+        raise NotImplementedError(f"{type(self).__name__} has no batch API")
+
+class ConcurrentBackend(BatchBackend):
+    """Interactive completions under the service-wide concurrency limit"""
+    
+    async def complete(self, bodies):
+        async def one(custom_id, body):
+            try:
+                async with travel_agent_service._completion_slots:
+                    completion = await asyncio.to_thread(travel_agent_service.provider.complete, body)
+                usage_tracker.record_completion(body["model"], completion.prompt_tokens, completion.completion_tokens)
+                return custom_id, completion.content
+            except Exception as e:
+                logger.error("Completion %s failed: %s", custom_id, e)
+                return custom_id, None
+        
+        done = await asyncio.gather(*(one(custom_id, body) for custom_id, body in bodies.items()))
+        return {custom_id: content for custom_id, content in done if content is not None}
+
+class ProviderBatchBackend(ConcurrentBackend):
+    """OpenAI-style files + batches API (offered by both the Groq and OpenAI SDKs); direct completions as ConcurrentBackend"""
+    supports_batch = True
+    
+    def __init__(self, client):
+        self.client = client
+    
+    async def submit(self, bodies):
+        lines = [
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+            for custom_id, body in bodies.items()
+        ]
+        upload = await asyncio.to_thread(
+            self.client.files.create,
+            file=("prewarm.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await asyncio.to_thread(
+            self.client.batches.create,
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+    
+    async def poll(self, batch_id):
+        batch = await asyncio.to_thread(self.client.batches.retrieve, batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return None
+        if batch.status != "completed" or not batch.output_file_id:
+            # failed, expired or cancelled: every request is retried on the next run
+            logger.warning("Batch %s ended with status %s", batch_id, batch.status)
+            return {}
+        
+        content = await asyncio.to_thread(self.client.files.content, batch.output_file_id)
+        results = {}
+        for line in content.read().decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return results
+
+class FakeBatchBackend(BatchBackend):
+    """Deterministic local provider with a batch API, for tests and dry runs.
+    
+    Batches finish after `polls_until_done` polls, and outputs are built from the
+    prompt text, so the same prompt always yields the same plan.
+    """
+    supports_batch = True
+    
+    def __init__(self, polls_until_done: int = 1):
+        self.polls_until_done = polls_until_done
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.submitted = 0
+    
+    async def submit(self, bodies):
+        batch_id = f"fake-batch-{len(self.batches) + 1}"
+        self.batches[batch_id] = {"bodies": dict(bodies), "polls": 0}
+        self.submitted += len(bodies)
+        return batch_id
+    
+    async def poll(self, batch_id):
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return {}
+        batch["polls"] += 1
+        if batch["polls"] < self.polls_until_done:
+            return None
+        return {custom_id: fake_completion(body["messages"][-1]["content"]) for custom_id, body in batch["bodies"].items()}
+    
+    async def complete(self, bodies):
+        self.submitted += len(bodies)
+        return {custom_id: fake_completion(body["messages"][-1]["content"]) for custom_id, body in bodies.items()}
+
+def create_backend(provider: str) -> BatchBackend:
+    if provider == "fake":
+        return FakeBatchBackend()
+    if provider == "concurrent":
+        return ConcurrentBackend()
+    llm = travel_agent_service.provider
+    if provider == "batch" or (provider == "auto" and llm.supports_batch):
+        return ProviderBatchBackend(llm.client)
+    return ConcurrentBackend()
+
+class PrewarmState:
+    """Progress persisted between runs so an interrupted job resumes where it stopped"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.bookings: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, List[str]] = {}
+        self.results: Dict[str, str] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.bookings = data.get("bookings", {})
+            self.batches = data.get("batches", {})
+            self.results = data.get("results", {})
+    
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"bookings": self.bookings, "batches": self.batches, "results": self.results}, f)
+        os.replace(tmp, self.path)
+    
+    def custom_ids(self, booking_id: str) -> List[str]:
+        return [f"{booking_id}:{key}" for key in self.bookings[booking_id]["jobs"]["prompts"]]
+
+async def prewarm(days_ahead: int, preferences: TravelPreferences, backend: BatchBackend, state: PrewarmState,
+                  status: str = "accepted", limit: Optional[int] = None, poll_interval: float = 30.0) -> Dict[str, int]:
+    """Run (or resume) one prewarm pass and return counts per outcome"""
+    if not plan_repository.persistent:
+        # Plans would vanish with the process while the state file keeps them marked done
+        raise RuntimeError(
+            f"PLAN_STORE_BACKEND={settings.PLAN_STORE_BACKEND} does not persist plans; prewarm needs mysql or mongo"
+        )
+    await plan_repository.init()
+    booking_ids = (await asyncio.to_thread(get_upcoming_booking_ids, days_ahead, status))[:limit]
+    bookings = await asyncio.to_thread(get_bookings_details, booking_ids)
+    counts = {"scanned": len(booking_ids), "already_stored": 0, "generated": 0, "failed": 0}
+    
+    # 1. Build prompts for every booking that has no stored plan yet
+    for booking_id, booking in bookings.items():
+        key = str(booking_id)
+        request = AgentRequest(
+            booking_context=BookingContext(
+                booking_id=booking_id,
+                location=f"{booking['city']}, {booking['state']}",
+                start_date=booking['start_date'],
+                end_date=booking['end_date'],
+                num_guests=booking['num_guests']
+            ),
+            preferences=preferences
+        )
+        fingerprint = plan_fingerprint(request)
+        entry = state.bookings.get(key)
+        # The repository is the source of truth: a plan marked done may have expired or been deleted since
+        if await plan_repository.get_by_fingerprint(fingerprint):
+            state.bookings[key] = {"fingerprint": fingerprint, "status": "done", "user_id": booking.get("traveler_id")}
+            counts["already_stored"] += 1
+            continue
+        if entry and entry["status"] == "done":
+            logger.info("Plan for booking %s is no longer stored; regenerating", booking_id)
+        if entry and entry["fingerprint"] == fingerprint and entry["status"] in ("prepared", "submitted"):
+            continue
+        
+        if entry and "jobs" in entry:
+            # Preferences changed since the last run: drop results for the old prompts
+            for custom_id in state.custom_ids(key):
+                state.results.pop(custom_id, None)
+        try:
+            jobs = await travel_agent_service.prepare_plan_jobs(request, booking)
+        except Exception as e:
+            logger.error("Could not prepare booking %s: %s", booking_id, e)
+            counts["failed"] += 1
+            continue
+        state.bookings[key] = {
+            "fingerprint": fingerprint,
+            "status": "prepared",
+            "user_id": booking.get("traveler_id"),
+            "jobs": jobs.model_dump(mode="json")
+        }
+        state.save()
+    
+    # 2. Complete every prompt that has neither a result nor an open batch
+    submitted = {custom_id for ids in state.batches.values() for custom_id in ids}
+    pending = {}
+    for key, entry in state.bookings.items():
+        if entry["status"] not in ("prepared", "submitted"):
+            continue
+        for custom_id in state.custom_ids(key):
+            if custom_id not in state.results and custom_id not in submitted:
+                prompt = entry["jobs"]["prompts"][custom_id.split(":", 1)[1]]
+                pending[custom_id] = travel_agent_service.completion_body(prompt)
+    
+    if pending and backend.supports_batch:
+        batch_id = await backend.submit(pending)
+        state.batches[batch_id] = list(pending)
+        for custom_id in pending:
+            state.bookings[custom_id.split(":", 1)[0]]["status"] = "submitted"
+        state.save()
+        logger.info("Submitted batch %s with %d completions", batch_id, len(pending))
+    elif pending:
+        state.results.update(await backend.complete(pending))
+        state.save()
+    
+    while state.batches:
+        for batch_id in list(state.batches):
+            results = await backend.poll(batch_id)
+            if results is None:
+                continue
+            state.results.update(results)
+            del state.batches[batch_id]
+            state.save()
+        if state.batches:
+            await asyncio.sleep(poll_interval)
+    
+    # 3. Assemble and store finished plans
+    for key, entry in state.bookings.items():
+        if entry["status"] not in ("prepared", "submitted"):
+            continue
+        custom_ids = state.custom_ids(key)
+        jobs = PlanJobs.model_validate(entry["jobs"])
+        if not all(custom_id in state.results for custom_id in custom_ids):
+            # Some completions failed; forget them so the next run resubmits
+            entry["status"] = "prepared"
+            counts["failed"] += 1
+            continue
+        try:
+            plan = travel_agent_service.assemble_plan(
+                jobs, {custom_id.split(":", 1)[1]: state.results[custom_id] for custom_id in custom_ids}
+            )
+            await plan_repository.save(jobs.request.booking_context.booking_id, entry.get("user_id"), entry["fingerprint"], dumps(plan))
+        except Exception as e:
+            logger.error("Could not assemble plan for booking %s: %s", key, e)
+            for custom_id in custom_ids:
+                state.results.pop(custom_id, None)
+            entry["status"] = "prepared"
+            counts["failed"] += 1
+            continue
+        
+        entry["status"] = "done"
+        entry.pop("jobs", None)
+        for custom_id in custom_ids:
+            state.results.pop(custom_id, None)
+        counts["generated"] += 1
+        state.save()
+    
+    state.save()
+    return counts
+
+def main(argv: Optional[List[str]] = None) -> int:
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Precompute travel plans for upcoming bookings")
+    parser.add_argument("--days-ahead", type=int, default=7, help="Plan bookings starting within this many days")
+    parser.add_argument("--status", default="accepted", help="Booking status to plan for")
+    parser.add_argument("--budget", default="medium", choices=["low", "medium", "high"])
+    parser.add_argument("--interests", default="sightseeing,food", help="Comma-separated interests")
+    parser.add_argument("--provider", default="auto", choices=["auto", "batch", "concurrent", "fake"])
+    parser.add_argument("--state-file", default="prewarm-state.json")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between batch status polls")
+    parser.add_argument("--limit", type=int, default=None, help="Plan at most this many bookings")
+    args = parser.parse_args(argv)
+    
+    preferences = TravelPreferences(
+        budget=args.budget,
+        interests=[i.strip() for i in args.interests.split(",") if i.strip()]
+    )
+    try:
+        counts = asyncio.run(prewarm(
+            args.days_ahead, preferences, create_backend(args.provider), PrewarmState(args.state_file),
+            status=args.status, limit=args.limit, poll_interval=args.poll_interval
+        ))
+    except RuntimeError as e:
+        logger.error("Prewarm not started: %s", e)
+        return 2
+    print(json.dumps(counts))
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
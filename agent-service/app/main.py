@@ -1,14 +1,25 @@
+from app.utils.startup import startup_profile, run_warmup
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.agent import router as agent_router
 from app.config.settings import settings
+from app.utils.serialization import ORJSONModelResponse
+from app.utils.metrics import metrics
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.request_context import RequestContextMiddleware
+from app.middleware.deadline import DeadlineMiddleware
+from app.utils.log import setup_logging
+from app.repositories.plan_repository import plan_repository
+from app.config.database import init_db_pool
+from app.services.agent_service import travel_agent_service
+from app.services.tavily_service import tavily_service
+from fastapi.responses import JSONResponse
+import asyncio
+import json
 import logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (JSON lines written from a background thread)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
@@ -17,7 +28,8 @@ app = FastAPI(
     description="AI-powered travel concierge service for Hostly platform",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONModelResponse
 )
 
 # Add CORS middleware
@@ -29,9 +41,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress plan and booking-details payloads (repetitive JSON, often tens of KB)
+app.add_middleware(
+    CompressionMiddleware,
+    paths=[
+        r"^/api/agent/generate-plan",
+        r"^/api/agent/plans/",
+        r"^/api/agent/booking/\d+/details",
+    ],
+    minimum_size=settings.COMPRESSION_MIN_SIZE
+)
+
+# Per-request time budget; handlers are cancelled at the deadline or on client disconnect
+app.add_middleware(
+    DeadlineMiddleware,
+    default_seconds=settings.DEADLINE_DEFAULT_SECONDS,
+    route_seconds=json.loads(settings.DEADLINE_ROUTE_SECONDS or "{}"),
+    max_seconds=settings.DEADLINE_MAX_SECONDS
+)
+
+# Request ids and access records; added last so it wraps everything else
+app.add_middleware(RequestContextMiddleware)
+
 # Include routers
 app.include_router(agent_router, prefix="/api/agent", tags=["agent"])
 
+startup_profile.mark_imported()
+
+async def _warm_llm_client():
+    provider = await asyncio.to_thread(lambda: travel_agent_service.provider)
+    if provider.api_key or provider.base_url:
+        # A cheap authenticated call opens (and pools) the connection
+        await asyncio.to_thread(provider.warm)
+
+async def _warm_tavily_client():
+    await asyncio.to_thread(lambda: tavily_service.client)
+
+@app.on_event("startup")
+async def warm_up():
+    """Open the DB pool, plan store and upstream clients before reporting ready"""
+    await run_warmup({
+        "db_pool": lambda: asyncio.to_thread(init_db_pool),
+        "plan_store": plan_repository.init,
+        "llm_client": _warm_llm_client,
+        "tavily_client": _warm_tavily_client,
+    }, startup_profile, settings.WARMUP_TIMEOUT_SECONDS)
+    for name, step in startup_profile.steps.items():
+        if step["status"] != "ok":
+            logger.warning("Warm-up step %s: %s", name, step['status'])
+    logger.info("Ready in %ss", startup_profile.report()['ready_seconds'])
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -49,9 +108,22 @@ async def status():
         "service": "hostly-ai-agent",
         "status": "healthy",
         "version": "1.0.0",
-        "environment": "development" if settings.DEBUG else "production"
+        "environment": "development" if settings.DEBUG else "production",
+        "startup": startup_profile.report()
     }
 
+@app.get("/api/metrics")
+async def service_metrics():
+    """In-process counters and gauges (prefetch hit rate, etc.)"""
+    return metrics.snapshot()
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness probe: 503 until warm-up has finished"""
+    if not startup_profile.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready"}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
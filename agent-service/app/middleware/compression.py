@@ -0,0 +1,95 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Iterable, Optional
+import gzip
+import re
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header"""
+    offered = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[token.strip().lower()] = q
+    
+    wildcard = offered.get("*", 0.0)
+    candidates = (("br",) if brotli else ()) + ("gzip",)
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = offered.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+class CompressionMiddleware:
+    """Negotiated brotli/gzip compression for selected JSON routes.
+    
+    Only complete (non-streaming) bodies above minimum_size are compressed;
+    streamed responses pass through untouched so they are not buffered.
+    """
+    
+    def __init__(self, app: ASGIApp, paths: Iterable[str], minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.paths = [re.compile(path) for path in paths]
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not any(p.match(scope["path"]) for p in self.paths):
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message: Optional[Message] = None
+        passthrough = False
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body", False) or "content-encoding" in headers
+                    or start_message["status"] in (204, 304) or len(body) < self.minimum_size):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+            
+            if encoding == "br":
+                body = brotli.compress(body, quality=self.brotli_quality)
+            else:
+                body = gzip.compress(body, compresslevel=self.gzip_level)
+            
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            # A compressed representation is a different entity; keep ETags distinct per encoding
+            etag = headers.get("etag")
+            if etag and etag.endswith('"'):
+                headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+        
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,95 @@
+from app.utils.deadline import deadline_after
+from app.utils.log import current_request
+from app.utils.metrics import metrics
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Dict, Optional
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DeadlineMiddleware:
+    """Give each request a time budget and cancel its work when the budget or the client is gone.
+    
+    The budget comes from the X-Request-Timeout header (seconds, capped at
+    max_seconds) or the per-route default. The middleware owns the ASGI
+    receive channel so it notices a disconnect while the handler is still busy.
+    """
+    
+    def __init__(self, app: ASGIApp, default_seconds: float, route_seconds: Optional[Dict[str, float]] = None, max_seconds: float = 600):
+        self.app = app
+        self.default_seconds = default_seconds
+        self.route_seconds = route_seconds or {}
+        self.max_seconds = max_seconds
+    
+    def budget(self, scope: Scope) -> float:
+        context = current_request()
+        route = context.route if context else scope["path"]
+        seconds = self.route_seconds.get(route, self.default_seconds)
+        header = Headers(scope=scope).get("x-request-timeout")
+        if header:
+            try:
+                seconds = float(header)
+            except ValueError:
+                pass
+        return max(0.1, min(seconds, self.max_seconds))
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        seconds = self.budget(scope)
+        inbox: asyncio.Queue = asyncio.Queue()
+        response_started = False
+        
+        async def app_receive() -> Message:
+            return await inbox.get()
+        
+        async def app_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+        
+        with deadline_after(seconds):
+            handler = asyncio.create_task(self.app(scope, app_receive, app_send))
+        
+        async def pump() -> None:
+            # Single reader of the real channel; a disconnect cancels the handler
+            while True:
+                message = await receive()
+                await inbox.put(message)
+                if message["type"] == "http.disconnect":
+                    if not handler.done():
+                        metrics.inc("requests_cancelled_total", reason="client_disconnect")
+                        handler.cancel()
+                    return
+        
+        reader = asyncio.create_task(pump())
+        try:
+            done, _ = await asyncio.wait({handler}, timeout=seconds)
+            if not done:
+                metrics.inc("requests_cancelled_total", reason="deadline")
+                logger.warning("Deadline of %ss exceeded for %s %s", seconds, scope["method"], scope["path"])
+                handler.cancel()
+                try:
+                    await handler
+                except asyncio.CancelledError:
+                    pass
+                if not response_started:
+                    body = json.dumps({"detail": "Deadline exceeded"}).encode("utf-8")
+                    await send({
+                        "type": "http.response.start",
+                        "status": 504,
+                        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+                    })
+                    await send({"type": "http.response.body", "body": body})
+                return
+            if handler.cancelled():
+                return  # the client went away; nobody is waiting for a response
+            handler.result()
+        finally:
+            reader.cancel()
@@ -0,0 +1,54 @@
+from app.utils.log import request_context, new_request_id
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import logging
+import time
+
+access_logger = logging.getLogger("app.access")
+
+class RequestContextMiddleware:
+    """Give every request an id (X-Request-Id in, out) and write one access record.
+    
+    The route template (e.g. /api/agent/booking/{booking_id}/details) is used for
+    sampling and in the access record so high-cardinality paths group together.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request_id = Headers(scope=scope).get("x-request-id") or new_request_id()
+        route = _route_template(scope)
+        status = 500
+        
+        async def send_with_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message)["X-Request-Id"] = request_id
+            await send(message)
+        
+        with request_context(route, request_id) as context:
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                if access_logger.isEnabledFor(logging.INFO):
+                    access_logger.info(
+                        "%s %s %s", scope["method"], scope["path"], status,
+                        extra={"status": status, "duration_ms": round((time.perf_counter() - context.started) * 1000, 2)}
+                    )
+
+def _route_template(scope: Scope) -> str:
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    if router is not None:
+        for route in router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+    return scope["path"]
@@ -0,0 +1,80 @@
+from app.models.schemas import DayForecast, TravelPreferences
+from typing import Dict, Iterable, Optional, Tuple
+import threading
+
+class StringTable:
+    """Bounded intern table so repeated strings in long-lived cache entries share one object.
+
+    Conditions, sources, dates, interests and dietary filters repeat across thousands
+    of entries; interning keeps one copy of each. Once the table is full, new strings
+    are kept as they are rather than growing the table without bound.
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._strings: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def intern(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        found = self._strings.get(value)
+        if found is not None:
+            return found
+        with self._lock:
+            if len(self._strings) < self.max_entries:
+                return self._strings.setdefault(value, value)
+        return value
+
+    def intern_all(self, values: Optional[Iterable[str]]) -> Optional[Tuple[str, ...]]:
+        if values is None:
+            return None
+        return tuple(self.intern(value) for value in values)
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+strings = StringTable()
+
+class CompactForecast:
+    """Cached form of a DayForecast: slots and interned strings instead of a model instance"""
+
+    __slots__ = ("date", "condition", "high_f", "low_f", "source")
+
+    def __init__(self, date: str, condition: str, high_f: Optional[int], low_f: Optional[int], source: str):
+        self.date = strings.intern(date)
+        self.condition = strings.intern(condition)
+        self.high_f = high_f
+        self.low_f = low_f
+        self.source = strings.intern(source)
+
+    @classmethod
+    def from_model(cls, forecast: DayForecast) -> "CompactForecast":
+        return cls(forecast.date, forecast.condition, forecast.high_f, forecast.low_f, forecast.source)
+
+    def to_model(self) -> DayForecast:
+        # Values were validated when the forecast was first built
+        return DayForecast.model_construct(
+            date=self.date, condition=self.condition, high_f=self.high_f, low_f=self.low_f, source=self.source
+        )
+
+class CompactPreferences:
+    """Cached form of TravelPreferences; the enums are singletons and the lists become tuples of interned strings"""
+
+    __slots__ = ("budget", "interests", "mobility_needs", "dietary_filters", "party_type")
+
+    def __init__(self, preferences: TravelPreferences):
+        self.budget = preferences.budget
+        self.interests = strings.intern_all(preferences.interests)
+        self.mobility_needs = preferences.mobility_needs
+        self.dietary_filters = strings.intern_all(preferences.dietary_filters)
+        self.party_type = strings.intern(preferences.party_type)
+
+    def to_model(self) -> TravelPreferences:
+        return TravelPreferences.model_construct(
+            budget=self.budget,
+            interests=list(self.interests),
+            mobility_needs=self.mobility_needs,
+            dietary_filters=list(self.dietary_filters) if self.dietary_filters is not None else None,
+            party_type=self.party_type
+        )
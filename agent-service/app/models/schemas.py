@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import date, datetime
 from enum import Enum
 
@@ -107,20 +107,28 @@ class RestaurantRec(BaseModel):
 class DayPlan(BaseModel):
     day_number: int
     date: str
-    morning: List[ActivityCard]
-    afternoon: List[ActivityCard]
-    evening: List[ActivityCard]
-    restaurants: List[RestaurantRec]
+    morning: List[ActivityCard] = Field(default_factory=list)
+    afternoon: List[ActivityCard] = Field(default_factory=list)
+    evening: List[ActivityCard] = Field(default_factory=list)
+    restaurants: List[RestaurantRec] = Field(default_factory=list)
 
 class PackingItem(BaseModel):
     item: str
     reason: str
     category: str  # clothing, accessories, documents, etc.
 
+class DayForecast(BaseModel):
+    date: str
+    condition: str  # e.g., "sunny", "rain", "unknown"
+    high_f: Optional[int] = None
+    low_f: Optional[int] = None
+    source: str = "outlook"  # forecast, outlook, unavailable
+
 class AgentResponse(BaseModel):
     itinerary: List[DayPlan]
     packing_checklist: List[PackingItem]
     weather_forecast: str
+    weather_days: Optional[List[DayForecast]] = None
     total_estimated_cost: Optional[str] = None
     tips: Optional[List[str]] = None
     
@@ -135,6 +143,50 @@ class AgentResponse(BaseModel):
             }
         }
 
+class PlanSlot(str, Enum):
+    MORNING = "morning"
+    AFTERNOON = "afternoon"
+    EVENING = "evening"
+    RESTAURANTS = "restaurants"
+
+class PlanEditRequest(BaseModel):
+    request: AgentRequest = Field(..., description="The request the plan was generated from")
+    plan: Optional[AgentResponse] = Field(None, description="Ignored: edits always apply to the latest stored plan for the booking")
+    day_number: int = Field(..., gt=0, description="Day of the itinerary to regenerate")
+    slot: Optional[PlanSlot] = Field(None, description="Slot to regenerate; the whole day when omitted")
+    instructions: Optional[str] = Field(None, description="What the traveler wants changed (e.g., 'swap restaurant', 'something outdoors')")
+
+class BatchPlanRequest(BaseModel):
+    requests: List[AgentRequest] = Field(default_factory=list, description="Full plan requests")
+    booking_ids: List[int] = Field(default_factory=list, description="Bookings to plan with the shared preferences")
+    preferences: Optional[TravelPreferences] = Field(None, description="Preferences applied to booking_ids")
+    refresh: bool = Field(False, description="Regenerate even when a stored plan exists")
+
+class PlanJobs(BaseModel):
+    """Everything needed to turn raw completions into an AgentResponse"""
+    request: AgentRequest
+    location: str
+    chunks: List[Tuple[int, int]]  # (first_day, day_count) per itinerary chunk
+    prompts: Dict[str, str]  # "itinerary:<first_day>", "packing", "tips"
+    weather_days: List[DayForecast]
+    weather_info: str
+
+# Completion payloads (the JSON shapes the LLM is asked to return)
+class ItineraryPayload(BaseModel):
+    days: List[DayPlan] = Field(default_factory=list)
+
+class PackingPayload(BaseModel):
+    items: List[PackingItem] = Field(default_factory=list)
+
+class TipsPayload(BaseModel):
+    tips: List[str] = Field(default_factory=list)
+
+class ActivitySlotPayload(BaseModel):
+    items: List[ActivityCard] = Field(default_factory=list)
+
+class RestaurantSlotPayload(BaseModel):
+    items: List[RestaurantRec] = Field(default_factory=list)
+
 class ErrorResponse(BaseModel):
     error: str
     detail: Optional[str] = None
@@ -0,0 +1,252 @@
+from app.config.settings import settings
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+import hashlib
+import json
+import re
+import time
+
+@dataclass
+class Completion:
+    content: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+class LLMProvider(ABC):
+    """Chat completions behind one interface, whatever serves them.
+    
+    Subclasses wrap an SDK client (built lazily on first use) and declare what
+    the backend supports. Calls are blocking; the agent service runs them in a
+    worker thread under its concurrency limit.
+    """
+    name = "base"
+    supports_streaming = False
+    supports_json_mode = False
+    supports_batch = False
+    
+    def __init__(self, model: str, api_key: str = "", base_url: Optional[str] = None, stream: bool = False, json_mode: bool = False, timeout: float = 60.0):
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.stream = stream and self.supports_streaming
+        self.json_mode = json_mode and self.supports_json_mode
+        self.timeout = timeout
+        self._client = None
+    
+    @property
+    def client(self):
+        """SDK client, imported and built on first use to keep pod start-up fast"""
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+    
+    @client.setter
+    def client(self, value):
+        self._client = value
+    
+    @abstractmethod
+    def _build_client(self):
+        """Import the SDK and build its client"""
+    
+    def completion_body(self, messages: List[Dict[str, str]], temperature: float, model: Optional[str] = None) -> Dict[str, Any]:
+        """Request parameters, shared by interactive calls and provider batch files"""
+        body = {"model": model or self.model, "messages": messages, "temperature": temperature}
+        if self.json_mode:
+            body["response_format"] = {"type": "json_object"}
+        return body
+    
+    def complete(self, body: Dict[str, Any], timeout: Optional[float] = None) -> Completion:
+        """Run one completion; timeout (seconds) overrides the client default for this call"""
+        if self.stream:
+            return self._complete_streaming(body, timeout)
+        response = self.client.chat.completions.create(**body, **self._timeout(timeout))
+        usage = getattr(response, "usage", None)
+        return Completion(
+            content=response.choices[0].message.content,
+            model=getattr(response, "model", None) or body["model"],
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0
+        )
+    
+    def stream_text(self, body: Dict[str, Any]) -> Iterator[str]:
+        """Yield content deltas as the backend produces them"""
+        for chunk in self.client.chat.completions.create(**body, stream=True, **self._stream_options()):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def _stream_options(self) -> Dict[str, Any]:
+        return {}
+    
+    def _timeout(self, timeout: Optional[float]) -> Dict[str, Any]:
+        return {"timeout": timeout} if timeout else {}
+    
+    def _complete_streaming(self, body: Dict[str, Any], timeout: Optional[float] = None) -> Completion:
+        parts, usage = [], None
+        for chunk in self.client.chat.completions.create(**body, stream=True, **self._stream_options(), **self._timeout(timeout)):
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            usage = self._chunk_usage(chunk) or usage
+        return Completion(
+            content="".join(parts),
+            model=body["model"],
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0
+        )
+    
+    def _chunk_usage(self, chunk):
+        return getattr(chunk, "usage", None)
+    
+    def warm(self) -> None:
+        """Open (and pool) the connection with a cheap authenticated call"""
+        self.client.models.list()
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any server speaking the OpenAI chat API at base_url (vLLM, TGI, llama.cpp, Ollama, ...)"""
+    name = "openai_compatible"
+    supports_streaming = True
+    supports_json_mode = True
+    
+    def _build_client(self):
+        from openai import OpenAI
+        # Self-hosted servers often ignore the key, but the SDK insists on one
+        # Retries are decided by the caller against the request deadline, not by the SDK
+        return OpenAI(api_key=self.api_key or "not-needed", base_url=self.base_url, timeout=self.timeout, max_retries=0)
+    
+    def _stream_options(self):
+        return {"stream_options": {"include_usage": True}}
+
+class OpenAIProvider(OpenAICompatibleProvider):
+    name = "openai"
+    supports_batch = True
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+    supports_streaming = True
+    supports_json_mode = True
+    supports_batch = True
+    
+    def _build_client(self):
+        from groq import Groq
+        return Groq(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=0)
+    
+    def _chunk_usage(self, chunk):
+        # Groq reports usage on the last chunk under x_groq
+        x_groq = getattr(chunk, "x_groq", None)
+        return getattr(x_groq, "usage", None) or getattr(chunk, "usage", None)
+
+class FakeProvider(LLMProvider):
+    """Deterministic offline backend for tests, benchmarks and load tests.
+    
+    Output is valid JSON for every prompt the agent builds and depends only on
+    the prompt text. LLM_FAKE_LATENCY_MS simulates generation time.
+    """
+    name = "fake"
+    supports_streaming = True
+    supports_json_mode = True
+    
+    def __init__(self, *args, latency_ms: float = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency_ms = latency_ms
+        self.calls = 0
+    
+    def _build_client(self):
+        return None
+    
+    def complete(self, body, timeout=None):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        prompt = body["messages"][-1]["content"]
+        content = fake_completion(prompt)
+        return Completion(
+            content=content,
+            model=body["model"],
+            prompt_tokens=sum(len(m["content"]) for m in body["messages"]) // 4,
+            completion_tokens=len(content) // 4
+        )
+    
+    def stream_text(self, body):
+        content = self.complete(body).content
+        for start in range(0, len(content), 64):
+            yield content[start:start + 64]
+    
+    def warm(self):
+        pass
+
+def fake_completion(prompt: str) -> str:
+    """Valid JSON output for the kind of prompt given"""
+    location_match = re.search(r"- Location: (.+)|trip to (.+?)\.|itinerary in (.+?)\.\n", prompt)
+    location = next((g for g in location_match.groups() if g), "the city") if location_match else "the city"
+    # Stable per prompt, so repeated runs produce the same plan
+    variant = int(hashlib.blake2b(prompt.encode("utf-8"), digest_size=2).hexdigest(), 16) % 7 + 1
+    
+    if "packing checklist" in prompt:
+        return json.dumps({"items": [
+            {"item": "Comfortable walking shoes", "reason": "Lots of walking planned", "category": "clothing"},
+            {"item": "Phone charger", "reason": "Maps and tickets on the phone", "category": "electronics"}
+        ]})
+    if "practical travel tips" in prompt:
+        return json.dumps({"tips": ["Book popular attractions in advance", "Use public transportation"]})
+    if prompt.startswith("Suggest") and "restaurant recommendations" in prompt:
+        return json.dumps({"items": [_fake_restaurant(location, variant)]})
+    if prompt.startswith("Suggest"):
+        return json.dumps({"items": [_fake_activity(location, variant)]})
+    if '"days"' not in prompt:
+        return json.dumps({"response": f"Fake response for {location}"})
+    
+    first_day = int(re.search(r'"day_number": (\d+)', prompt).group(1))
+    span = re.search(r"days (\d+)-(\d+) of", prompt) or re.search(r"detailed (\d+)-day", prompt)
+    if span is None:
+        day_count = 1
+    elif span.lastindex == 2:
+        day_count = int(span.group(2)) - int(span.group(1)) + 1
+    else:
+        day_count = int(span.group(1))
+    return json.dumps({"days": [
+        {
+            "day_number": day_number, "date": "",
+            "morning": [_fake_activity(location, day_number)],
+            "restaurants": [_fake_restaurant(location, day_number)]
+        }
+        for day_number in range(first_day, first_day + day_count)
+    ]})
+
+def _fake_activity(location: str, n: int) -> Dict[str, Any]:
+    return {
+        "title": f"{location} walking tour {n}", "address": location,
+        "price_tier": "$", "duration": "2-3 hours", "tags": ["sightseeing"],
+        "wheelchair_accessible": True, "child_friendly": True
+    }
+
+def _fake_restaurant(location: str, n: int) -> Dict[str, Any]:
+    return {
+        "name": f"Local bistro {n}", "cuisine": "local", "address": location,
+        "price_tier": "$$", "dietary_options": ["vegetarian"]
+    }
+
+_PROVIDERS = {
+    "groq": GroqProvider,
+    "openai": OpenAIProvider,
+    "openai_compatible": OpenAICompatibleProvider,
+    "fake": FakeProvider
+}
+
+def create_llm_provider(name: Optional[str] = None, model: Optional[str] = None) -> LLMProvider:
+    """Build the backend selected by LLM_PROVIDER"""
+    name = (name or settings.LLM_PROVIDER).lower()
+    provider_class = _PROVIDERS.get(name)
+    if provider_class is None:
+        raise ValueError(f"Unknown LLM_PROVIDER '{name}' (expected one of {', '.join(_PROVIDERS)})")
+    kwargs = dict(
+        model=model or settings.LLM_MODEL,
+        api_key=settings.LLM_API_KEY,
+        base_url=settings.LLM_BASE_URL,
+        stream=settings.LLM_STREAM,
+        json_mode=settings.LLM_JSON_MODE,
+        timeout=settings.LLM_TIMEOUT_SECONDS
+    )
+    if provider_class is FakeProvider:
+        kwargs["latency_ms"] = settings.LLM_FAKE_LATENCY_MS
+    return provider_class(**kwargs)
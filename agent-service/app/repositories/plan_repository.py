@@ -0,0 +1,291 @@
+from app.config.settings import settings
+from app.config.database import get_db_connection
+from app.models.schemas import AgentRequest
+from app.utils.serialization import make_etag
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import json
+import threading
+
+# Bump when the prompts or the AgentResponse shape change so old plans stop matching
+PLAN_SCHEMA_VERSION = 1
+
+class StoredPlan(BaseModel):
+    booking_id: int
+    user_id: Optional[int] = None
+    fingerprint: str
+    version: int
+    etag: str
+    plan_json: bytes
+    created_at: datetime
+    expires_at: datetime
+
+def plan_fingerprint(request: AgentRequest) -> str:
+    """Stable hash of everything that influences the generated plan"""
+    payload = request.model_dump(mode="json")
+    payload["_schema"] = PLAN_SCHEMA_VERSION
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class PlanRepository(ABC):
+    """Async plan storage indexed by booking, user and request fingerprint"""
+    # Whether saved plans outlive the process
+    persistent = True
+    
+    async def init(self) -> None:
+        """Create tables/indexes; safe to call repeatedly"""
+    
+    @abstractmethod
+    async def get_by_fingerprint(self, fingerprint: str) -> Optional[StoredPlan]:
+        ...
+    
+    @abstractmethod
+    async def get_latest_for_booking(self, booking_id: int) -> Optional[StoredPlan]:
+        ...
+    
+    @abstractmethod
+    async def list_for_user(self, user_id: int, limit: int = 20) -> List[StoredPlan]:
+        ...
+    
+    @abstractmethod
+    async def save(self, booking_id: int, user_id: Optional[int], fingerprint: str, plan_json: bytes) -> StoredPlan:
+        ...
+    
+    def _new_record(self, booking_id, user_id, fingerprint, plan_json, version) -> StoredPlan:
+        now = datetime.utcnow()
+        return StoredPlan(
+            booking_id=booking_id,
+            user_id=user_id,
+            fingerprint=fingerprint,
+            version=version,
+            etag=make_etag(plan_json),
+            plan_json=plan_json,
+            created_at=now,
+            expires_at=now + timedelta(seconds=settings.PLAN_TTL_SECONDS)
+        )
+
+class NullPlanRepository(PlanRepository):
+    """Storage disabled: every lookup misses and saves are not kept"""
+    persistent = False
+    
+    async def get_by_fingerprint(self, fingerprint):
+        return None
+    
+    async def get_latest_for_booking(self, booking_id):
+        return None
+    
+    async def list_for_user(self, user_id, limit=20):
+        return []
+    
+    async def save(self, booking_id, user_id, fingerprint, plan_json):
+        return self._new_record(booking_id, user_id, fingerprint, plan_json, 1)
+
+class InMemoryPlanRepository(PlanRepository):
+    """Per-process store for development and single-replica deployments"""
+    persistent = False
+    
+    def __init__(self):
+        self._plans: List[StoredPlan] = []
+        self._by_fingerprint: Dict[str, StoredPlan] = {}
+        self._by_booking: Dict[int, StoredPlan] = {}
+        self._lock = threading.Lock()
+    
+    def _live(self, plan: Optional[StoredPlan]) -> Optional[StoredPlan]:
+        return plan if plan and plan.expires_at > datetime.utcnow() else None
+    
+    async def get_by_fingerprint(self, fingerprint):
+        return self._live(self._by_fingerprint.get(fingerprint))
+    
+    async def get_latest_for_booking(self, booking_id):
+        return self._live(self._by_booking.get(booking_id))
+    
+    async def list_for_user(self, user_id, limit=20):
+        plans = [p for p in self._plans if p.user_id == user_id and self._live(p)]
+        return sorted(plans, key=lambda p: p.created_at, reverse=True)[:limit]
+    
+    def _evict(self, now: datetime) -> None:
+        """Drop expired plans, then the oldest past PLAN_MEMORY_MAX_ENTRIES, from the list and both indexes"""
+        kept = [p for p in self._plans if p.expires_at > now]
+        # Leave room for the plan about to be saved
+        overflow = len(kept) - max(settings.PLAN_MEMORY_MAX_ENTRIES - 1, 0)
+        if overflow > 0:
+            kept = kept[overflow:]
+        if len(kept) == len(self._plans):
+            return
+        live = {id(p) for p in kept}
+        self._plans = kept
+        self._by_fingerprint = {k: p for k, p in self._by_fingerprint.items() if id(p) in live}
+        self._by_booking = {k: p for k, p in self._by_booking.items() if id(p) in live}
+    
+    async def save(self, booking_id, user_id, fingerprint, plan_json):
+        with self._lock:
+            self._evict(datetime.utcnow())
+            latest = self._by_booking.get(booking_id)
+            record = self._new_record(booking_id, user_id, fingerprint, plan_json, (latest.version if latest else 0) + 1)
+            self._plans.append(record)
+            self._by_fingerprint[fingerprint] = record
+            self._by_booking[booking_id] = record
+            return record
+
+class MySQLPlanRepository(PlanRepository):
+    """Plans in the agent_plans table of the booking database"""
+    
+    _COLUMNS = "booking_id, user_id, fingerprint, version, etag, plan_json, created_at, expires_at"
+    
+    async def init(self):
+        await asyncio.to_thread(self._execute, """
+        CREATE TABLE IF NOT EXISTS agent_plans (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            booking_id INT NOT NULL,
+            user_id INT NULL,
+            fingerprint CHAR(64) NOT NULL,
+            version INT NOT NULL,
+            etag VARCHAR(80) NOT NULL,
+            plan_json LONGBLOB NOT NULL,
+            created_at DATETIME NOT NULL,
+            expires_at DATETIME NOT NULL,
+            UNIQUE KEY uq_agent_plans_booking_version (booking_id, version),
+            KEY idx_agent_plans_fingerprint (fingerprint, expires_at),
+            KEY idx_agent_plans_user (user_id, created_at)
+        )
+        """)
+    
+    def _execute(self, query, params=(), fetch=None):
+        conn = get_db_connection()
+        cursor = None
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, params)
+            if fetch == "one":
+                return cursor.fetchone()
+            if fetch == "all":
+                return cursor.fetchall()
+            conn.commit()
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+            conn.close()
+    
+    def _to_plan(self, row) -> Optional[StoredPlan]:
+        if not row:
+            return None
+        row["plan_json"] = bytes(row["plan_json"])
+        return StoredPlan(**row)
+    
+    async def get_by_fingerprint(self, fingerprint):
+        row = await asyncio.to_thread(
+            self._execute,
+            f"SELECT {self._COLUMNS} FROM agent_plans WHERE fingerprint = %s AND expires_at > UTC_TIMESTAMP() ORDER BY version DESC LIMIT 1",
+            (fingerprint,), "one"
+        )
+        return self._to_plan(row)
+    
+    async def get_latest_for_booking(self, booking_id):
+        row = await asyncio.to_thread(
+            self._execute,
+            f"SELECT {self._COLUMNS} FROM agent_plans WHERE booking_id = %s AND expires_at > UTC_TIMESTAMP() ORDER BY version DESC LIMIT 1",
+            (booking_id,), "one"
+        )
+        return self._to_plan(row)
+    
+    async def list_for_user(self, user_id, limit=20):
+        rows = await asyncio.to_thread(
+            self._execute,
+            f"SELECT {self._COLUMNS} FROM agent_plans WHERE user_id = %s AND expires_at > UTC_TIMESTAMP() ORDER BY created_at DESC LIMIT %s",
+            (user_id, limit), "all"
+        )
+        return [self._to_plan(row) for row in rows]
+    
+    async def save(self, booking_id, user_id, fingerprint, plan_json):
+        return await asyncio.to_thread(self._save, booking_id, user_id, fingerprint, plan_json)
+    
+    def _save(self, booking_id, user_id, fingerprint, plan_json):
+        conn = get_db_connection()
+        cursor = None
+        try:
+            cursor = conn.cursor(dictionary=True)
+            # The unique (booking_id, version) key turns a concurrent save into a retry
+            for _ in range(3):
+                cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM agent_plans WHERE booking_id = %s", (booking_id,))
+                record = self._new_record(booking_id, user_id, fingerprint, plan_json, cursor.fetchone()["version"] + 1)
+                try:
+                    cursor.execute(
+                        f"INSERT INTO agent_plans ({self._COLUMNS}) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                        (record.booking_id, record.user_id, record.fingerprint, record.version, record.etag,
+                         record.plan_json, record.created_at, record.expires_at)
+                    )
+                    conn.commit()
+                    return record
+                except Exception as e:
+                    conn.rollback()
+                    if getattr(e, "errno", None) != 1062:  # ER_DUP_ENTRY
+                        raise
+            raise RuntimeError(f"Could not allocate a plan version for booking {booking_id}")
+        finally:
+            if cursor:
+                cursor.close()
+            conn.close()
+
+class MongoPlanRepository(PlanRepository):
+    """Plans in the agent_plans collection of the Mongo instance from docker-compose"""
+    
+    def __init__(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+        
+        self._client = AsyncIOMotorClient(settings.MONGODB_URI)
+        self._plans = self._client[settings.MONGODB_DB]["agent_plans"]
+    
+    async def init(self):
+        await self._plans.create_index([("booking_id", 1), ("version", -1)], unique=True)
+        await self._plans.create_index([("fingerprint", 1), ("version", -1)])
+        await self._plans.create_index([("user_id", 1), ("created_at", -1)])
+        # Mongo removes documents once expires_at has passed
+        await self._plans.create_index("expires_at", expireAfterSeconds=0)
+    
+    def _to_plan(self, doc) -> Optional[StoredPlan]:
+        if not doc or doc["expires_at"] <= datetime.utcnow():
+            return None
+        doc.pop("_id", None)
+        return StoredPlan(**doc)
+    
+    async def get_by_fingerprint(self, fingerprint):
+        return self._to_plan(await self._plans.find_one({"fingerprint": fingerprint}, sort=[("version", -1)]))
+    
+    async def get_latest_for_booking(self, booking_id):
+        return self._to_plan(await self._plans.find_one({"booking_id": booking_id}, sort=[("version", -1)]))
+    
+    async def list_for_user(self, user_id, limit=20):
+        cursor = self._plans.find({"user_id": user_id}).sort("created_at", -1).limit(limit)
+        return [plan for plan in (self._to_plan(doc) async for doc in cursor) if plan]
+    
+    async def save(self, booking_id, user_id, fingerprint, plan_json):
+        from pymongo.errors import DuplicateKeyError
+        
+        for _ in range(3):
+            latest = await self._plans.find_one({"booking_id": booking_id}, sort=[("version", -1)], projection={"version": 1})
+            record = self._new_record(booking_id, user_id, fingerprint, plan_json, (latest["version"] if latest else 0) + 1)
+            try:
+                await self._plans.insert_one(record.model_dump())
+                return record
+            except DuplicateKeyError:
+                continue
+        raise RuntimeError(f"Could not allocate a plan version for booking {booking_id}")
+
+def create_plan_repository() -> PlanRepository:
+    """Build the backend selected by PLAN_STORE_BACKEND"""
+    backend = settings.PLAN_STORE_BACKEND.lower()
+    if backend == "mysql":
+        return MySQLPlanRepository()
+    if backend == "mongo":
+        return MongoPlanRepository()
+    if backend == "memory":
+        return InMemoryPlanRepository()
+    return NullPlanRepository()
+
+# Singleton instance
+plan_repository = create_plan_repository()
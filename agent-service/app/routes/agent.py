@@ -1,62 +1,213 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, Body, HTTPException, Depends, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.models.schemas import AgentRequest, AgentResponse, ErrorResponse
+from fastapi.responses import StreamingResponse
+from app.models.schemas import AgentRequest, AgentResponse, BatchPlanRequest, ErrorResponse, PlanEditRequest
 from app.services.agent_service import travel_agent_service
+from app.services.prefetch_service import prefetch_service
+from app.services.usage_service import usage_tracker, BudgetExceededError, RequestUsage
+from app.repositories.plan_repository import plan_repository, StoredPlan
 from app.config.settings import settings
-from typing import Dict, Any
+from app.utils.serialization import conditional_response
+from app.utils.log import current_request_id
+from app.utils.deadline import DeadlineExceeded
+from app.utils.timeouts import adaptive_timeouts, UpstreamTimeout
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import hmac
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _plan_response(stored: StoredPlan, usage: Optional[RequestUsage] = None) -> Response:
+    """Send the stored plan bytes as-is, with its ETag, version and what the request cost"""
+    headers = {"ETag": stored.etag, "X-Plan-Version": str(stored.version)}
+    if usage:
+        headers["X-Request-Id"] = usage.request_id
+        headers["X-Usage-Tokens"] = str(usage.prompt_tokens + usage.completion_tokens)
+        headers["X-Usage-Cost-USD"] = f"{usage.cost_usd:.6f}"
+    return Response(content=stored.plan_json, media_type="application/json", headers=headers)
+
+def _token_matches(given: Optional[str], expected: str) -> bool:
+    """Constant-time token check; an unset expected token never matches"""
+    return bool(expected) and given is not None and hmac.compare_digest(given.encode(), expected.encode())
+
+def _caller(http_request: Request) -> Tuple[Optional[int], Optional[str]]:
+    """
+    User and tenant asserted by a trusted gateway. The identity headers are ignored
+    unless the request carries GATEWAY_TOKEN, so clients cannot pick whose budget
+    they spend; usage then falls to the booking's traveler and the default tenant.
+    """
+    if not _token_matches(http_request.headers.get("X-Gateway-Token"), settings.GATEWAY_TOKEN):
+        return None, None
+    user_id = http_request.headers.get("X-User-Id", "")
+    return int(user_id) if user_id.isdigit() else None, http_request.headers.get("X-Tenant-Id")
+
+def _track(http_request: Request, route: str, booking_id: Optional[int] = None):
+    """Account upstream usage of this request to the caller's user and tenant"""
+    user_id, tenant = _caller(http_request)
+    return usage_tracker.track(
+        route,
+        user_id=user_id,
+        booking_id=booking_id,
+        tenant=tenant,
+        request_id=current_request_id()
+    )
+
+def _deadline_exceeded(e: Exception) -> HTTPException:
+    logger.warning("%s", e)
+    return HTTPException(status_code=504, detail=str(e))
+
+def _budget_exceeded(e: BudgetExceededError) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
 @router.post("/generate-plan", response_model=AgentResponse)
-async def generate_travel_plan(request: AgentRequest):
+async def generate_travel_plan(request: AgentRequest, http_request: Request, refresh: bool = False):
     """
-    Generate a complete AI-powered travel itinerary based on booking and preferences
+    Generate a complete AI-powered travel itinerary based on booking and preferences.
+    An identical earlier request is served from plan storage unless refresh=true.
     """
     try:
-        logger.info(f"Generating travel plan for booking {request.booking_context.booking_id}")
+        logger.info("Generating travel plan for booking %s", request.booking_context.booking_id)
         
         # Validate request
         if not request.booking_context.location and not request.booking_context.booking_id:
             raise HTTPException(status_code=400, detail="Either location or booking_id must be provided")
         
-        # Generate the travel plan
-        plan = await travel_agent_service.generate_travel_plan(request)
+        # Generate the travel plan (or reuse a stored one)
+        with _track(http_request, "generate-plan", request.booking_context.booking_id) as usage:
+            stored = await travel_agent_service.get_or_generate_plan(request, refresh=refresh)
         
-        logger.info(f"Successfully generated travel plan for booking {request.booking_context.booking_id}")
-        return plan
+        logger.info("Successfully generated travel plan for booking %s", request.booking_context.booking_id)
+        return _plan_response(stored, usage)
         
+    except HTTPException:
+        raise
+    except BudgetExceededError as e:
+        raise _budget_exceeded(e)
+    except (DeadlineExceeded, UpstreamTimeout) as e:
+        raise _deadline_exceeded(e)
     except ValueError as e:
-        logger.error(f"Validation error: {e}")
+        logger.error("Validation error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error generating travel plan: {e}")
+        logger.error("Error generating travel plan: %s", e)
         raise HTTPException(status_code=500, detail="Failed to generate travel plan")
 
+@router.post("/generate-plans/batch")
+async def generate_travel_plans_batch(batch: BatchPlanRequest, http_request: Request):
+    """
+    Generate plans for many bookings at once. Results stream back as NDJSON,
+    one line per booking, in completion order.
+    """
+    total = len(batch.requests) + len(batch.booking_ids)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="Provide requests or booking_ids")
+    if total > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_ITEMS} plans per batch")
+    
+    logger.info("Generating batch of %s travel plans", total)
+    return StreamingResponse(
+        travel_agent_service.generate_batch(batch, tenant=_caller(http_request)[1]),
+        media_type="application/x-ndjson"
+    )
+
+@router.post("/plans/regenerate-day", response_model=AgentResponse)
+async def regenerate_plan_day(edit: PlanEditRequest, http_request: Request):
+    """
+    Regenerate one day of an existing plan without redoing the whole plan
+    """
+    try:
+        logger.info("Regenerating day %s for booking %s", edit.day_number, edit.request.booking_context.booking_id)
+        with _track(http_request, "regenerate-day", edit.request.booking_context.booking_id) as usage:
+            stored = await travel_agent_service.regenerate_day(edit, caller_id=_caller(http_request)[0])
+        return _plan_response(stored, usage)
+        
+    except BudgetExceededError as e:
+        raise _budget_exceeded(e)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except (DeadlineExceeded, UpstreamTimeout) as e:
+        raise _deadline_exceeded(e)
+    except ValueError as e:
+        logger.error("Validation error: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error regenerating day: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to regenerate day")
+
+@router.post("/plans/regenerate-slot", response_model=AgentResponse)
+async def regenerate_plan_slot(edit: PlanEditRequest, http_request: Request):
+    """
+    Regenerate one slot (morning, afternoon, evening or restaurants) of one day
+    """
+    try:
+        logger.info("Regenerating day %s %s for booking %s", edit.day_number, edit.slot.value if edit.slot else '', edit.request.booking_context.booking_id)
+        with _track(http_request, "regenerate-slot", edit.request.booking_context.booking_id) as usage:
+            stored = await travel_agent_service.regenerate_slot(edit, caller_id=_caller(http_request)[0])
+        return _plan_response(stored, usage)
+        
+    except BudgetExceededError as e:
+        raise _budget_exceeded(e)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except (DeadlineExceeded, UpstreamTimeout) as e:
+        raise _deadline_exceeded(e)
+    except ValueError as e:
+        logger.error("Validation error: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error regenerating slot: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to regenerate slot")
+
+@router.get("/plans/booking/{booking_id}", response_model=AgentResponse)
+async def get_stored_plan(booking_id: int, http_request: Request):
+    """
+    Get the latest stored plan for a booking (supports If-None-Match)
+    """
+    try:
+        stored = await plan_repository.get_latest_for_booking(booking_id)
+        if not stored:
+            raise HTTPException(status_code=404, detail="No stored plan for this booking")
+        
+        response = conditional_response(http_request, stored.plan_json, etag=stored.etag)
+        response.headers["X-Plan-Version"] = str(stored.version)
+        return response
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error getting stored plan: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to get stored plan")
+
 @router.post("/quick-recommendations")
 async def get_quick_recommendations(
     location: str,
-    interests: list,
+    http_request: Request,
+    interests: List[str] = Body(...),
     budget: str = "medium"
 ):
     """
     Get quick recommendations for a location without full itinerary
     """
     try:
-        logger.info(f"Getting quick recommendations for {location}")
+        logger.info("Getting quick recommendations for %s", location)
         
-        recommendations = await travel_agent_service.get_quick_recommendations(
-            location, interests, budget
-        )
+        with _track(http_request, "quick-recommendations"):
+            usage_tracker.check_budget()
+            recommendations = await travel_agent_service.get_quick_recommendations(
+                location, interests, budget
+            )
         
         return recommendations
         
+    except BudgetExceededError as e:
+        raise _budget_exceeded(e)
+    except (DeadlineExceeded, UpstreamTimeout) as e:
+        raise _deadline_exceeded(e)
     except Exception as e:
-        logger.error(f"Error getting quick recommendations: {e}")
+        logger.error("Error getting quick recommendations: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get recommendations")
 
 @router.get("/health")
@@ -72,46 +223,71 @@ async def health_check():
     }
 
 @router.get("/booking/{booking_id}/details")
-async def get_booking_details(booking_id: int):
+async def get_booking_details(booking_id: int, http_request: Request):
     """
     Get booking details for a specific booking ID
     """
     try:
         from app.config.database import get_booking_details
         
-        booking = get_booking_details(booking_id)
+        booking = await adaptive_timeouts.call(
+            "db", "booking", lambda timeout: asyncio.to_thread(get_booking_details, booking_id), retries=0
+        )
         if not booking:
             raise HTTPException(status_code=404, detail="Booking not found")
         
-        return booking
+        # A plan request usually follows; start its searches in the background
+        prefetch_service.schedule(booking)
         
+        return conditional_response(http_request, booking)
+        
+    except HTTPException:
+        raise
+    except (DeadlineExceeded, UpstreamTimeout) as e:
+        raise _deadline_exceeded(e)
     except Exception as e:
-        logger.error(f"Error getting booking details: {e}")
+        logger.error("Error getting booking details: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get booking details")
 
+@router.get("/admin/usage")
+async def get_usage(
+    user_id: Optional[int] = None,
+    booking_id: Optional[int] = None,
+    tenant: Optional[str] = None,
+    limit: int = 50,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Token, search and cost totals per user, booking and tenant, with recent requests
+    """
+    if not _token_matches(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    return usage_tracker.report(user_id=user_id, booking_id=booking_id, tenant=tenant, limit=limit)
+
 @router.post("/test-ai")
 async def test_ai_connection():
     """
     Test AI service connection
     """
     try:
-        # Simple test to verify OpenAI connection
-        from openai import AsyncOpenAI
-        
-        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        
-        response = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": "Say 'AI service is working'"}],
+        # Simple round trip through the configured provider
+        provider = travel_agent_service.provider
+        body = provider.completion_body(
+            [{"role": "user", "content": "Say 'AI service is working'"}],
             temperature=0.1
         )
+        # JSON mode requires the prompt to ask for JSON; this one does not
+        body.pop("response_format", None)
+        completion = await asyncio.to_thread(provider.complete, body)
         
         return {
             "status": "success",
             "message": "AI service is working",
-            "response": response.choices[0].message.content
+            "provider": provider.name,
+            "model": completion.model,
+            "response": completion.content
         }
         
     except Exception as e:
-        logger.error(f"AI service test failed: {e}")
+        logger.error("AI service test failed: %s", e)
         raise HTTPException(status_code=500, detail=f"AI service test failed: {str(e)}")
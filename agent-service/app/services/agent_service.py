@@ -1,111 +1,524 @@
-from groq import Groq
 from app.config.settings import settings
-from app.config.database import get_booking_details, get_user_preferences
+from app.config.database import get_booking_details, get_bookings_details, get_user_preferences
 from app.services.tavily_service import tavily_service
-from app.models.schemas import AgentRequest, AgentResponse, DayPlan, PackingItem
-from typing import Dict, Any, List
+from app.services.weather_service import weather_service, canonical_location
+from app.services.distillation_service import snippet_distiller
+from app.services.prefetch_service import prefetch_service
+from app.services.usage_service import usage_tracker, BudgetExceededError, DOWNGRADE
+from app.models.schemas import AgentRequest, AgentResponse, BatchPlanRequest, BookingContext, DayForecast, DayPlan, PlanEditRequest, PlanJobs, PlanSlot
+from app.providers.llm import LLMProvider, create_llm_provider
+from app.utils.cache import TTLCache, SingleFlight
+from app.utils.log import stage
+from app.utils.deadline import bounded
+from app.utils.timeouts import adaptive_timeouts
+from app.repositories.plan_repository import plan_repository, plan_fingerprint, StoredPlan
+from app.utils.serialization import dumps, ITINERARY_ADAPTER, PACKING_ADAPTER, TIPS_ADAPTER, ACTIVITY_SLOT_ADAPTER, RESTAURANT_SLOT_ADAPTER
+from pydantic import TypeAdapter
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+import asyncio
 import json
 from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
 
 class TravelAgentService:
     def __init__(self):
-        self.client = Groq(api_key=settings.OPENAI_API_KEY)  # Using same env var for Groq API key
+        self._provider: Optional[LLMProvider] = None
+        self._completion_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_COMPLETIONS)
+        self._search_cache = TTLCache(max_entries=settings.SEARCH_CACHE_MAX_ENTRIES)
+        self._searches = SingleFlight()
+    
+    @property
+    def provider(self) -> LLMProvider:
+        """LLM backend selected by LLM_PROVIDER, built on first use"""
+        if self._provider is None:
+            self._provider = create_llm_provider()
+        return self._provider
+    
+    @provider.setter
+    def provider(self, value: LLMProvider):
+        self._provider = value
+    
+    async def get_or_generate_plan(self, request: AgentRequest, refresh: bool = False, booking_details: Optional[Dict[str, Any]] = None) -> StoredPlan:
+        """Serve a stored plan for an identical request, generating and storing one on a miss"""
+        fingerprint = plan_fingerprint(request)
+        if request.booking_context.location:
+            prefetch_service.record_request(
+                request.booking_context.booking_id,
+                self.search_key(request.booking_context.location, request.preferences),
+                fingerprint
+            )
+        if not refresh:
+            with stage("plan_lookup"):
+                stored = await plan_repository.get_by_fingerprint(fingerprint)
+            if stored:
+                prefetch_service.remember_preferences(stored.user_id, request.preferences)
+                return stored
+            draft = prefetch_service.take_draft(fingerprint)
+            if draft:
+                # The traveler asked for exactly the prefetched plan: keep it for real now
+                traveler_id, plan_json = draft
+                with stage("plan_store"):
+                    return await plan_repository.save(request.booking_context.booking_id, traveler_id, fingerprint, plan_json)
+        
+        if booking_details is None:
+            booking_details = await self._fetch_booking(request.booking_context.booking_id)
+        if not booking_details:
+            raise ValueError(f"Booking {request.booking_context.booking_id} not found")
+        if not request.booking_context.location:
+            prefetch_service.record_request(
+                request.booking_context.booking_id,
+                self.search_key(f"{booking_details['city']}, {booking_details['state']}", request.preferences),
+                fingerprint
+            )
+        prefetch_service.remember_preferences(booking_details.get('traveler_id'), request.preferences)
+        
+        usage = usage_tracker.current()
+        if usage and usage.user_id is None:
+            usage.user_id = booking_details.get('traveler_id')
+        if usage_tracker.check_budget() == DOWNGRADE:
+            # Near the budget: any stored plan for the booking beats a new generation
+            latest = await plan_repository.get_latest_for_booking(request.booking_context.booking_id)
+            if latest:
+                return latest
+        
+        plan = await self.generate_travel_plan(request, booking_details)
+        with stage("plan_store"):
+            return await plan_repository.save(
+                request.booking_context.booking_id,
+                booking_details.get('traveler_id'),
+                fingerprint,
+                dumps(plan)
+            )
+    
+    async def generate_batch(self, batch: BatchPlanRequest, tenant: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Generate plans for many bookings, yielding one NDJSON line per plan as it finishes.
+        
+        All bookings are loaded in one query, searches for a shared destination are
+        coalesced, and completions share the service-wide concurrency limit.
+        """
+        booking_ids = [r.booking_context.booking_id for r in batch.requests] + list(batch.booking_ids)
+        bookings = await adaptive_timeouts.call(
+            "db", "bookings", lambda timeout: asyncio.to_thread(get_bookings_details, booking_ids), retries=0
+        )
+        
+        requests: List[Tuple[int, Optional[AgentRequest]]] = [(r.booking_context.booking_id, r) for r in batch.requests]
+        for booking_id in batch.booking_ids:
+            booking = bookings.get(booking_id)
+            if not booking or not batch.preferences:
+                requests.append((booking_id, None))
+                continue
+            requests.append((booking_id, AgentRequest(
+                booking_context=BookingContext(
+                    booking_id=booking_id,
+                    location=f"{booking['city']}, {booking['state']}",
+                    start_date=booking['start_date'],
+                    end_date=booking['end_date'],
+                    num_guests=booking['num_guests']
+                ),
+                preferences=batch.preferences
+            )))
+        
+        plan_slots = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENT_PLANS)
+        
+        async def run(booking_id: int, request: Optional[AgentRequest]) -> bytes:
+            if booking_id not in bookings:
+                return _batch_line(booking_id, "error", error="Booking not found")
+            if request is None:
+                return _batch_line(booking_id, "error", error="preferences are required for booking_ids")
+            try:
+                async with plan_slots:
+                    with usage_tracker.track("batch", bookings[booking_id].get('traveler_id'), booking_id, tenant):
+                        stored = await self.get_or_generate_plan(request, batch.refresh, bookings[booking_id])
+                return _batch_line(booking_id, "ok", stored=stored)
+            except BudgetExceededError as e:
+                return _batch_line(booking_id, "error", error=str(e))
+            except Exception as e:
+                logger.error("Error generating batch plan for booking %s: %s", booking_id, e)
+                return _batch_line(booking_id, "error", error="Failed to generate travel plan")
+        
+        tasks = [asyncio.create_task(run(booking_id, request)) for booking_id, request in requests]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away: stop generating plans nobody will read
+            for task in tasks:
+                task.cancel()
     
-    async def generate_travel_plan(self, request: AgentRequest) -> AgentResponse:
+    
+    async def generate_travel_plan(self, request: AgentRequest, booking_details: Optional[Dict[str, Any]] = None) -> AgentResponse:
         """Generate a complete travel plan based on booking and preferences"""
         try:
-            # Get booking details from database
-            booking_details = get_booking_details(request.booking_context.booking_id)
+            # Get booking details from database unless the caller already loaded them
+            if booking_details is None:
+                booking_details = await self._fetch_booking(request.booking_context.booking_id)
             if not booking_details:
                 raise ValueError(f"Booking {request.booking_context.booking_id} not found")
             
-            # Calculate trip duration
-            start_date = request.booking_context.start_date
-            end_date = request.booking_context.end_date
-            num_days = (end_date - start_date).days
-            
-            # Get location info
-            location = request.booking_context.location or f"{booking_details['city']}, {booking_details['state']}"
+            jobs = await self.prepare_plan_jobs(request, booking_details)
             
-            # Search for attractions and restaurants
-            attractions_info = tavily_service.search_attractions(location, request.preferences.interests)
-            restaurants_info = tavily_service.search_restaurants(location, request.preferences.dietary_filters)
-            weather_info = tavily_service.get_weather_forecast(location, str(start_date), str(end_date))
+            # Itinerary chunks, packing list and tips are independent completions,
+            # so they are generated concurrently
+            keys = list(jobs.prompts)
+            with stage("completions"):
+                tasks = [asyncio.create_task(self._complete(jobs.prompts[key], key.split(":")[0])) for key in keys]
+                try:
+                    results = await asyncio.gather(*tasks)
+                finally:
+                    # One failed part fails the plan; stop paying for the others
+                    for task in tasks:
+                        task.cancel()
             
-            # Generate itinerary using OpenAI
-            itinerary_prompt = self._build_itinerary_prompt(
-                num_days, location, start_date, end_date,
-                request.booking_context.num_guests,
-                request.preferences, attractions_info,
-                restaurants_info, weather_info, request.custom_query
-            )
+            with stage("assemble"):
+                return self.assemble_plan(jobs, dict(zip(keys, results)))
             
-            itinerary_response = self.client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[
-                    {"role": "system", "content": self._get_system_prompt()},
-                    {"role": "user", "content": itinerary_prompt}
-                ],
-                temperature=settings.AGENT_TEMPERATURE
+        except Exception as e:
+            logger.error("Error generating travel plan: %s", e)
+            raise
+    
+    async def prepare_plan_jobs(self, request: AgentRequest, booking_details: Dict[str, Any]) -> PlanJobs:
+        """Run the searches and build every completion prompt needed for one plan.
+        
+        Prompts are keyed "itinerary:<first_day>", "packing" and "tips" so they can
+        be completed interactively or submitted to a provider batch API.
+        """
+        # Calculate trip duration
+        start_date = request.booking_context.start_date
+        end_date = request.booking_context.end_date
+        num_days = (end_date - start_date).days
+        
+        # Get location info
+        location = request.booking_context.location or f"{booking_details['city']}, {booking_details['state']}"
+        
+        # Search for attractions and restaurants
+        with stage("search"):
+            (attractions_info, restaurants_info), weather_days = await asyncio.gather(
+                self._get_search_context(location, request.preferences),
+                self._get_weather(location, start_date, end_date)
             )
-            
-            # Parse itinerary response
-            itinerary_data = json.loads(itinerary_response.choices[0].message.content)
-            itinerary = self._parse_itinerary(itinerary_data, start_date)
-            
-            # Generate packing list
-            packing_prompt = self._build_packing_prompt(
-                location, start_date, end_date, num_days,
+        weather_info = weather_service.format_forecast(weather_days)
+        
+        chunks = self._plan_chunks(num_days)
+        prompts = {
+            f"itinerary:{first_day}": prompt
+            for (first_day, _), prompt in zip(chunks, self._build_itinerary_prompts(
+                chunks, num_days, location, start_date,
                 request.booking_context.num_guests,
-                request.preferences.interests, weather_info
-            )
+                request.preferences, attractions_info,
+                restaurants_info, weather_days, request.custom_query
+            ))
+        }
+        prompts["packing"] = self._build_packing_prompt(
+            location, start_date, end_date, num_days,
+            request.booking_context.num_guests,
+            request.preferences.interests, weather_info
+        )
+        prompts["tips"] = self._build_tips_prompt(
+            location, start_date, end_date,
+            request.preferences.budget.value,
+            request.preferences.interests
+        )
+        
+        return PlanJobs(
+            request=request,
+            location=location,
+            chunks=chunks,
+            prompts=prompts,
+            weather_days=weather_days,
+            weather_info=weather_info
+        )
+    
+    def assemble_plan(self, jobs: PlanJobs, outputs: Dict[str, str]) -> AgentResponse:
+        """Validate the raw completion outputs for a PlanJobs and build the AgentResponse"""
+        start_date = jobs.request.booking_context.start_date
+        
+        itinerary = []
+        for first_day, day_count in jobs.chunks:
+            days = self._parse_itinerary(outputs[f"itinerary:{first_day}"], start_date)
+            # Renumber defensively: chunks are asked to number from first_day,
+            # but the merge order must not depend on the model getting that right
+            for offset, day_plan in enumerate(days[:day_count]):
+                day_plan.day_number = first_day + offset
+                day_plan.date = str(start_date + timedelta(days=first_day - 1 + offset))
+                itinerary.append(day_plan)
+        itinerary = self._drop_repeated_venues(itinerary)
+        
+        packing_checklist = PACKING_ADAPTER.validate_json(outputs["packing"]).items
+        tips = TIPS_ADAPTER.validate_json(outputs["tips"]).tips
+        
+        # Estimate total cost
+        total_cost = self._estimate_total_cost(itinerary, jobs.request.preferences.budget.value)
+        
+        # Every part was validated as it was parsed, so skip re-validating the tree
+        return AgentResponse.model_construct(
+            itinerary=itinerary,
+            packing_checklist=packing_checklist,
+            weather_forecast=jobs.weather_info,
+            weather_days=jobs.weather_days,
+            total_estimated_cost=total_cost,
+            tips=tips
+        )
+    
+    async def regenerate_day(self, edit: PlanEditRequest, caller_id: Optional[int] = None) -> StoredPlan:
+        """Regenerate a single DayPlan of the stored plan, keeping every other day"""
+        return await self._regenerate(edit, None, caller_id)
+    
+    async def regenerate_slot(self, edit: PlanEditRequest, caller_id: Optional[int] = None) -> StoredPlan:
+        """Regenerate one slot (morning, afternoon, evening or restaurants) of one day"""
+        if not edit.slot:
+            raise ValueError("slot is required to regenerate a slot")
+        return await self._regenerate(edit, edit.slot, caller_id)
+    
+    async def _regenerate(self, edit: PlanEditRequest, slot: Optional[PlanSlot], caller_id: Optional[int]) -> StoredPlan:
+        """
+        Apply a targeted edit to the latest stored plan for the booking, using cached
+        search context and a focused prompt, and store the result as its next version.
+        
+        The plan in the request is not trusted. When the caller is known it must be
+        the plan's owner (the booking's traveler when the plan has no owner).
+        """
+        try:
+            request = edit.request
+            booking_id = request.booking_context.booking_id
+            stored = await plan_repository.get_latest_for_booking(booking_id)
+            if not stored:
+                raise ValueError(f"No stored plan for booking {booking_id}")
             
-            packing_response = self.client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[
-                    {"role": "system", "content": self._get_system_prompt()},
-                    {"role": "user", "content": packing_prompt}
-                ],
-                temperature=settings.AGENT_TEMPERATURE
-            )
+            booking_details = None
+            owner_id = stored.user_id
+            if owner_id is None:
+                booking_details = await self._fetch_booking(booking_id)
+                if not booking_details:
+                    raise ValueError(f"Booking {booking_id} not found")
+                owner_id = booking_details.get('traveler_id')
+            if caller_id is not None and caller_id != owner_id:
+                raise PermissionError(f"Booking {booking_id} belongs to another traveler")
+            usage = usage_tracker.current()
+            if usage and usage.user_id is None:
+                usage.user_id = owner_id
             
-            packing_data = json.loads(packing_response.choices[0].message.content)
-            packing_checklist = [PackingItem(**item) for item in packing_data.get('items', [])]
+            # Parsed fresh from storage, so the edited day can be changed in place
+            plan = AgentResponse.model_validate_json(stored.plan_json)
+            day_index = next((i for i, day in enumerate(plan.itinerary) if day.day_number == edit.day_number), None)
+            if day_index is None:
+                raise ValueError(f"Day {edit.day_number} is not part of this plan")
+            day = plan.itinerary[day_index]
+            usage_tracker.check_budget()
             
-            # Generate travel tips
-            tips_prompt = self._build_tips_prompt(
-                location, start_date, end_date,
-                request.preferences.budget.value,
-                request.preferences.interests
-            )
+            location = request.booking_context.location
+            if not location:
+                booking_details = booking_details or await self._fetch_booking(booking_id)
+                if not booking_details:
+                    raise ValueError(f"Booking {booking_id} not found")
+                location = f"{booking_details['city']}, {booking_details['state']}"
             
-            tips_response = self.client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[
-                    {"role": "system", "content": self._get_system_prompt()},
-                    {"role": "user", "content": tips_prompt}
-                ],
-                temperature=settings.AGENT_TEMPERATURE
+            attractions_info, restaurants_info = await self._get_search_context(location, request.preferences)
+            day_date = datetime.strptime(day.date, "%Y-%m-%d").date()
+            weather_info = weather_service.format_forecast(
+                await self._get_weather(location, day_date, day_date + timedelta(days=1))
             )
+            # Everything used on the other days (and in the untouched slots) stays off-limits
+            avoid = [
+                name
+                for other in plan.itinerary if other is not day
+                for name in self._venue_names(other)
+            ]
             
-            tips_data = json.loads(tips_response.choices[0].message.content)
-            tips = tips_data.get('tips', [])
-            
-            # Estimate total cost
-            total_cost = self._estimate_total_cost(itinerary, request.preferences.budget.value)
+            if slot is None:
+                prompt = self._build_day_edit_prompt(
+                    location, day, request.preferences, attractions_info, restaurants_info,
+                    weather_info, avoid, edit.instructions
+                )
+                data = await self._complete_json(prompt, ITINERARY_ADAPTER)
+                days = self._parse_itinerary(data, request.booking_context.start_date)
+                if not days:
+                    raise ValueError("Model returned no day plan")
+                new_day = days[0]
+                new_day.day_number = day.day_number
+                new_day.date = day.date
+                plan.itinerary[day_index] = new_day
+            else:
+                avoid += self._venue_names(day)
+                prompt = self._build_slot_edit_prompt(
+                    location, day, slot, request.preferences,
+                    restaurants_info if slot == PlanSlot.RESTAURANTS else attractions_info,
+                    weather_info, avoid, edit.instructions
+                )
+                adapter = RESTAURANT_SLOT_ADAPTER if slot == PlanSlot.RESTAURANTS else ACTIVITY_SLOT_ADAPTER
+                data = await self._complete_json(prompt, adapter)
+                setattr(day, slot.value, data.items)
             
-            return AgentResponse(
-                itinerary=itinerary,
-                packing_checklist=packing_checklist,
-                weather_forecast=weather_info,
-                total_estimated_cost=total_cost,
-                tips=tips
-            )
+            plan.total_estimated_cost = self._estimate_total_cost(plan.itinerary, request.preferences.budget.value)
+            return await plan_repository.save(booking_id, owner_id, plan_fingerprint(request), dumps(plan))
             
         except Exception as e:
-            print(f"Error generating travel plan: {e}")
+            logger.error("Error editing travel plan: %s", e)
             raise
     
+    async def _fetch_booking(self, booking_id: int) -> Optional[Dict[str, Any]]:
+        return await adaptive_timeouts.call(
+            "db", "booking", lambda timeout: asyncio.to_thread(get_booking_details, booking_id), retries=0
+        )
+    
+    def search_key(self, location: str, preferences) -> Tuple:
+        return (
+            canonical_location(location),
+            tuple(sorted(i.casefold() for i in preferences.interests)),
+            tuple(sorted(d.casefold() for d in (preferences.dietary_filters or [])))
+        )
+    
+    def has_spare_capacity(self) -> bool:
+        """True while a completion could start without waiting for a slot"""
+        return not self._completion_slots.locked()
+    
+    async def _get_search_context(self, location: str, preferences, ttl: Optional[float] = None) -> Tuple[str, str]:
+        """Return (attractions, restaurants) search results, cached per location and preferences.
+        
+        Concurrent requests for the same key (e.g. a batch with many bookings in
+        one city) share a single in-flight search.
+        """
+        key = self.search_key(location, preferences)
+        cached = self._search_cache.get(key)
+        if cached:
+            return cached
+        
+        async def search() -> Tuple[str, str]:
+            attractions, restaurants = await asyncio.gather(
+                adaptive_timeouts.call("tavily", "search", lambda timeout: asyncio.to_thread(
+                    tavily_service.search_attractions_raw, location, preferences.interests, timeout
+                )),
+                adaptive_timeouts.call("tavily", "search", lambda timeout: asyncio.to_thread(
+                    tavily_service.search_restaurants_raw, location, preferences.dietary_filters, timeout
+                ))
+            )
+            # Dedupe across both searches and keep only informative sentences; this is
+            # CPU-bound, so it runs off the event loop
+            distilled = await asyncio.to_thread(
+                snippet_distiller.distill,
+                [attractions, restaurants],
+                query_terms=[location, *preferences.interests, *(preferences.dietary_filters or [])]
+            )
+            context = tuple(json.dumps(results, separators=(",", ":"), ensure_ascii=False) for results in distilled)
+            # Empty results usually mean a failed search; do not pin them in the cache
+            if context != ("[]", "[]"):
+                self._search_cache.set(key, context, ttl or settings.SEARCH_CACHE_TTL_SECONDS)
+            return context
+        
+        try:
+            # Waiting on a search another request started is still bounded by our own deadline
+            return await bounded(self._searches.do(key, search), "search")
+        except asyncio.TimeoutError:
+            # A slow search provider degrades the plan rather than failing it
+            logger.warning("Search timed out for %s", location)
+            return "[]", "[]"
+    
+    async def _get_weather(self, location: str, start_date, end_date) -> List[DayForecast]:
+        """Per-day weather lookup off the event loop, coalesced per location and range"""
+        key = ("weather", canonical_location(location), start_date, end_date)
+        try:
+            return await bounded(self._searches.do(key, lambda: adaptive_timeouts.call(
+                "tavily", "weather", lambda timeout: asyncio.to_thread(weather_service.get_forecast, location, start_date, end_date, timeout)
+            )), "weather")
+        except asyncio.TimeoutError:
+            logger.warning("Weather lookup timed out for %s", location)
+            return []
+    
+    def _venue_names(self, day: DayPlan) -> List[str]:
+        return [a.title for a in day.morning + day.afternoon + day.evening] + [r.name for r in day.restaurants]
+    
+    async def _complete_json(self, prompt: str, adapter: TypeAdapter, op: str = "edit") -> Any:
+        """Run one completion and validate its JSON straight from the raw text"""
+        return adapter.validate_json(await self._complete(prompt, op))
+    
+    def completion_body(self, prompt: str) -> Dict[str, Any]:
+        """Chat completion parameters for a prompt, shared by interactive and batch paths"""
+        usage = usage_tracker.current()
+        return self.provider.completion_body(
+            [
+                {"role": "system", "content": self._get_system_prompt()},
+                {"role": "user", "content": prompt}
+            ],
+            settings.AGENT_TEMPERATURE,
+            model=usage.model if usage else None
+        )
+    
+    async def _complete(self, prompt: str, op: str = "itinerary") -> str:
+        """Run one completion under the shared concurrency limit"""
+        if self._completion_slots.locked():
+            # Interactive work is about to queue: give it the slots held by prefetches
+            prefetch_service.yield_capacity()
+        body = self.completion_body(prompt)
+        await bounded(self._completion_slots.acquire(), "completion")
+        try:
+            # The SDK aborts the HTTP call itself, so an abandoned request stops using quota
+            completion = await adaptive_timeouts.call(
+                "llm", op, lambda timeout: asyncio.to_thread(self.provider.complete, body, timeout)
+            )
+        finally:
+            self._completion_slots.release()
+        usage_tracker.record_completion(body["model"], completion.prompt_tokens, completion.completion_tokens)
+        return completion.content
+    
+    def _build_itinerary_prompts(self, chunks, num_days, location, start_date, num_guests, preferences, attractions_info, restaurants_info, weather_days, custom_query) -> List[str]:
+        """Build one prompt per day-range chunk, each with its own slice of venues"""
+        attractions = self._split_venues(attractions_info, len(chunks))
+        restaurants = self._split_venues(restaurants_info, len(chunks))
+        
+        prompts = []
+        for index, (first_day, day_count) in enumerate(chunks):
+            chunk_start = start_date + timedelta(days=first_day - 1)
+            reserved = [
+                venue.get('title', '')
+                for other in range(len(chunks)) if other != index
+                for venue in attractions[other] + restaurants[other]
+            ]
+            prompts.append(self._build_itinerary_prompt(
+                day_count, location, chunk_start, chunk_start + timedelta(days=day_count),
+                num_guests, preferences,
+                json.dumps(attractions[index], separators=(",", ":"), ensure_ascii=False),
+                json.dumps(restaurants[index], separators=(",", ":"), ensure_ascii=False),
+                weather_service.format_forecast(weather_days[first_day - 1:first_day - 1 + day_count]),
+                custom_query,
+                first_day=first_day,
+                total_days=num_days,
+                avoid_venues=reserved
+            ))
+        return prompts
+    
+    def _plan_chunks(self, num_days: int) -> List[tuple]:
+        """Split the trip into (first_day, day_count) ranges of at most ITINERARY_CHUNK_DAYS"""
+        size = max(settings.ITINERARY_CHUNK_DAYS, 1)
+        return [(first, min(size, num_days - first + 1)) for first in range(1, num_days + 1, size)]
+    
+    def _split_venues(self, search_results: str, num_chunks: int) -> List[List[Dict[str, Any]]]:
+        """Deal search results round-robin so every chunk gets its own venues"""
+        try:
+            results = json.loads(search_results)
+        except (TypeError, ValueError):
+            results = []
+        return [results[index::num_chunks] for index in range(num_chunks)]
+    
+    def _drop_repeated_venues(self, itinerary: List[DayPlan]) -> List[DayPlan]:
+        """Remove activities and restaurants already used on an earlier day"""
+        seen = set()
+        
+        def first_use(name: str) -> bool:
+            key = " ".join(name.casefold().split())
+            if key in seen:
+                return False
+            seen.add(key)
+            return True
+        
+        for day in itinerary:
+            day.morning = [a for a in day.morning if first_use(a.title)]
+            day.afternoon = [a for a in day.afternoon if first_use(a.title)]
+            day.evening = [a for a in day.evening if first_use(a.title)]
+            day.restaurants = [r for r in day.restaurants if first_use(r.name)]
+        
+        return itinerary
+    
     def _get_system_prompt(self) -> str:
         """Get the system prompt for the AI assistant"""
         return """You are an expert travel concierge AI assistant. Your role is to create personalized, detailed travel itineraries based on:
@@ -125,9 +538,15 @@ Guidelines:
 
 Always respond with valid JSON format."""
     
-    def _build_itinerary_prompt(self, num_days, location, start_date, end_date, num_guests, preferences, attractions_info, restaurants_info, weather_info, custom_query):
-        """Build the itinerary generation prompt"""
-        return f"""Create a detailed {num_days}-day itinerary for the following trip:
+    def _build_itinerary_prompt(self, num_days, location, start_date, end_date, num_guests, preferences, attractions_info, restaurants_info, weather_info, custom_query, first_day=1, total_days=None, avoid_venues=None):
+        """Build the itinerary generation prompt for days first_day..first_day+num_days-1"""
+        last_day = first_day + num_days - 1
+        if total_days and total_days > num_days:
+            scope = f"Create a detailed itinerary for days {first_day}-{last_day} of a {total_days}-day trip:"
+        else:
+            scope = f"Create a detailed {num_days}-day itinerary for the following trip:"
+        avoid = ", ".join(v for v in (avoid_venues or []) if v) or 'none'
+        return f"""{scope}
 
 BOOKING DETAILS:
 - Location: {location}
@@ -153,6 +572,9 @@ WEATHER FORECAST:
 CUSTOM REQUEST:
 {custom_query or 'No specific requests'}
 
+ALREADY USED ON OTHER DAYS (do not repeat):
+{avoid}
+
 For each day, create:
 1. MORNING (9 AM - 12 PM): 1-2 activities
 2. AFTERNOON (1 PM - 5 PM): 2-3 activities
@@ -183,8 +605,46 @@ Return ONLY valid JSON matching this structure:
 {{
   "days": [
     {{
-      "day_number": 1,
-      "date": "2025-11-01",
+      "day_number": {first_day},
+      "date": "{start_date}",
+      "morning": [...],
+      "afternoon": [...],
+      "evening": [...],
+      "restaurants": [...]
+    }}
+  ]
+}}"""
+    
+    def _build_day_edit_prompt(self, location, day, preferences, attractions_info, restaurants_info, weather_info, avoid_venues, instructions):
+        """Build a focused prompt that replaces one day of an existing itinerary"""
+        return f"""Replace day {day.day_number} ({day.date}) of an existing itinerary in {location}.
+
+PREFERENCES:
+- Budget: {preferences.budget.value}
+- Interests: {', '.join(preferences.interests)}
+- Mobility needs: {preferences.mobility_needs.value if preferences.mobility_needs else 'none'}
+- Dietary restrictions: {', '.join(preferences.dietary_filters) if preferences.dietary_filters else 'none'}
+
+WEATHER: {weather_info}
+
+TRAVELER'S REQUEST: {instructions or 'Suggest a different plan for this day'}
+
+DO NOT USE (already planned on other days): {', '.join(avoid_venues) or 'none'}
+
+AVAILABLE ATTRACTIONS:
+{attractions_info}
+
+AVAILABLE RESTAURANTS:
+{restaurants_info}
+
+Use the same activity and restaurant fields as the rest of the itinerary.
+
+Return ONLY valid JSON:
+{{
+  "days": [
+    {{
+      "day_number": {day.day_number},
+      "date": "{day.date}",
       "morning": [...],
       "afternoon": [...],
       "evening": [...],
@@ -193,6 +653,36 @@ Return ONLY valid JSON matching this structure:
   ]
 }}"""
     
+    def _build_slot_edit_prompt(self, location, day, slot, preferences, search_info, weather_info, avoid_venues, instructions):
+        """Build a focused prompt that replaces one slot of one day"""
+        if slot == PlanSlot.RESTAURANTS:
+            what = "2-3 restaurant recommendations"
+            fields = "name, cuisine, address, price_tier, dietary_options, rating, url"
+        else:
+            what = f"1-3 {slot.value} activities"
+            fields = "title, address, price_tier, duration, tags, wheelchair_accessible, child_friendly, description, url"
+        return f"""Suggest {what} for day {day.day_number} ({day.date}) of a trip to {location}.
+
+PREFERENCES:
+- Budget: {preferences.budget.value}
+- Interests: {', '.join(preferences.interests)}
+- Mobility needs: {preferences.mobility_needs.value if preferences.mobility_needs else 'none'}
+- Dietary restrictions: {', '.join(preferences.dietary_filters) if preferences.dietary_filters else 'none'}
+
+WEATHER: {weather_info}
+
+TRAVELER'S REQUEST: {instructions or 'Suggest different options'}
+
+DO NOT USE (already planned): {', '.join(avoid_venues) or 'none'}
+
+CANDIDATES:
+{search_info}
+
+Return ONLY valid JSON with these fields per item ({fields}):
+{{
+  "items": [...]
+}}"""
+    
     def _build_packing_prompt(self, location, start_date, end_date, num_days, num_guests, interests, weather_info):
         """Build the packing list generation prompt"""
         return f"""Based on the following trip details, create a comprehensive packing checklist:
@@ -247,22 +737,13 @@ Return as a simple JSON array of strings:
   "tips": ["tip1", "tip2", ...]
 }}"""
     
-    def _parse_itinerary(self, itinerary_data: Dict[str, Any], start_date: datetime) -> List[DayPlan]:
-        """Parse itinerary data into DayPlan objects"""
-        itinerary = []
-        
-        for day_data in itinerary_data.get('days', []):
-            day_plan = DayPlan(
-                day_number=day_data['day_number'],
-                date=day_data['date'],
-                morning=day_data.get('morning', []),
-                afternoon=day_data.get('afternoon', []),
-                evening=day_data.get('evening', []),
-                restaurants=day_data.get('restaurants', [])
-            )
-            itinerary.append(day_plan)
-        
-        return itinerary
+    def _parse_itinerary(self, itinerary_data: Any, start_date: datetime) -> List[DayPlan]:
+        """Parse itinerary data (a validated payload, raw JSON or a dict) into DayPlan objects"""
+        if isinstance(itinerary_data, (str, bytes)):
+            itinerary_data = ITINERARY_ADAPTER.validate_json(itinerary_data)
+        elif isinstance(itinerary_data, dict):
+            itinerary_data = ITINERARY_ADAPTER.validate_python(itinerary_data)
+        return list(itinerary_data.days)
     
     def _estimate_total_cost(self, itinerary: List[DayPlan], budget_level: str) -> str:
         """Estimate total trip cost based on itinerary and budget"""
@@ -289,8 +770,15 @@ Return as a simple JSON array of strings:
     async def get_quick_recommendations(self, location: str, interests: List[str], budget: str) -> Dict[str, Any]:
         """Get quick recommendations without full itinerary"""
         try:
-            attractions_info = tavily_service.search_attractions(location, interests)
-            restaurants_info = tavily_service.search_restaurants(location)
+            # Off the event loop and under the same adaptive timeouts as plan searches
+            attractions_info, restaurants_info = await asyncio.gather(
+                adaptive_timeouts.call("tavily", "search", lambda timeout: asyncio.to_thread(
+                    tavily_service.search_attractions, location, interests, timeout
+                )),
+                adaptive_timeouts.call("tavily", "search", lambda timeout: asyncio.to_thread(
+                    tavily_service.search_restaurants, location, None, timeout
+                ))
+            )
             
             return {
                 "attractions": json.loads(attractions_info),
@@ -300,8 +788,19 @@ Return as a simple JSON array of strings:
                 "budget": budget
             }
         except Exception as e:
-            print(f"Error getting quick recommendations: {e}")
+            logger.error("Error getting quick recommendations: %s", e)
             raise
 
+def _batch_line(booking_id: int, status: str, stored: Optional[StoredPlan] = None, error: Optional[str] = None) -> bytes:
+    """One NDJSON record; the stored plan bytes are spliced in without re-encoding"""
+    head = {"booking_id": booking_id, "status": status}
+    if error:
+        head["error"] = error
+    if stored is None:
+        return dumps(head) + b"\n"
+    head["version"] = stored.version
+    head["etag"] = stored.etag
+    return dumps(head)[:-1] + b',"plan":' + stored.plan_json + b"}\n"
+
 # Singleton instance
 travel_agent_service = TravelAgentService()
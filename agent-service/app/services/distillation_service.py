@@ -0,0 +1,165 @@
+from app.config.settings import settings
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import hashlib
+import math
+import re
+
+# Sentences that are site furniture rather than information
+_BOILERPLATE_RE = re.compile(
+    r"cookie|privacy policy|terms of (?:use|service)|all rights reserved|subscribe|newsletter|"
+    r"sign (?:up|in)|log ?in|click here|read more|learn more|skip to (?:main )?content|advertisement|"
+    r"sponsored|share (?:this|on)|follow us|download (?:the|our) app|javascript|affiliate|"
+    r"we may earn|table of contents|jump to",
+    re.IGNORECASE
+)
+_MARKUP_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)|\[([^\]]*)\]\([^)]*\)|<[^>]+>|https?://\S+|[#*_`|]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(]?[A-Z0-9])|\n+|\s+[•·▪]\s+")
+_WORD_RE = re.compile(r"[a-z0-9$][a-z0-9'$-]*")
+_TRACKING_PARAMS = ("utm_", "ref", "fbclid", "gclid", "mc_")
+_STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how
+i if in into is it its itself just me more most my no nor not now of off on once only or other our out over own
+same she should so some such than that the their them then there these they this those through to too under until
+up very was we were what when where which while who whom why will with you your best top visit one also 2024 2025
+""".split())
+
+_NUM_HASHES = 64
+_MERSENNE = (1 << 61) - 1
+_HASH_PARAMS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE)
+    for i in range(_NUM_HASHES)
+]
+
+def normalize_url(url: str) -> str:
+    """Canonical URL for dedup: no scheme/www/fragment/tracking params/trailing slash"""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith(_TRACKING_PARAMS)
+    ))
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, ""))
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.casefold())
+
+def minhash(text: str, shingle_size: int = 4) -> Optional[List[int]]:
+    """MinHash signature over word shingles; None for texts too short to compare"""
+    words = _words(text)
+    if len(words) < shingle_size:
+        return None
+    shingles = {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + shingle_size]).encode(), digest_size=8).digest(), "big")
+        for i in range(len(words) - shingle_size + 1)
+    }
+    return [min((a * x + b) % _MERSENNE for x in shingles) for a, b in _HASH_PARAMS]
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+def split_sentences(text: str) -> List[str]:
+    cleaned = _MARKUP_RE.sub(lambda m: m.group(1) or " ", text or "")
+    sentences = []
+    for sentence in _SENTENCE_RE.split(cleaned):
+        sentence = " ".join(sentence.split()).strip(" -–—:;,")
+        if len(sentence) >= 25 and not _BOILERPLATE_RE.search(sentence):
+            sentences.append(sentence)
+    return sentences
+
+class SnippetDistiller:
+    """Deduplicate and compress search results before they reach a prompt.
+    
+    Results are deduplicated across all searches of one request (by canonical
+    URL, then near-duplicate text via MinHash), boilerplate sentences are
+    dropped, and each result is reduced to its most informative sentences
+    within a character budget. Everything runs locally.
+    """
+    
+    def __init__(self, duplicate_threshold: float = 0.6):
+        self.duplicate_threshold = duplicate_threshold
+    
+    def distill(self, searches: Sequence[List[Dict[str, Any]]], query_terms: Sequence[str] = (), char_budget: Optional[int] = None) -> List[List[Dict[str, str]]]:
+        """Distill several result lists together; returns one list per input search"""
+        char_budget = char_budget or settings.DISTILL_CHARS_PER_SEARCH
+        seen_urls = set()
+        signatures: List[List[int]] = []
+        seen_sentences = set()
+        kept: List[List[Dict[str, Any]]] = []
+        
+        for results in searches:
+            unique = []
+            for result in results:
+                url = normalize_url(result.get('url', ''))
+                if url and url in seen_urls:
+                    continue
+                signature = minhash(f"{result.get('title', '')} {result.get('content', '')}")
+                if signature and any(similarity(signature, other) >= self.duplicate_threshold for other in signatures):
+                    continue
+                if url:
+                    seen_urls.add(url)
+                if signature:
+                    signatures.append(signature)
+                
+                sentences = []
+                for sentence in split_sentences(result.get('content', '')):
+                    key = " ".join(_words(sentence))
+                    if key not in seen_sentences:
+                        seen_sentences.add(key)
+                        sentences.append(sentence)
+                if sentences:
+                    unique.append({'title': result.get('title', ''), 'url': result.get('url', ''), 'sentences': sentences})
+            kept.append(unique)
+        
+        query = {word for term in query_terms for word in _words(term) if word not in _STOPWORDS}
+        return [self._summarize(results, query, char_budget) for results in kept]
+    
+    def _summarize(self, results: List[Dict[str, Any]], query: set, char_budget: int) -> List[Dict[str, str]]:
+        if not results:
+            return []
+        
+        # Term weights from this search only: words that recur across results are
+        # the topic; words in a single result are its specifics
+        document_frequency: Dict[str, int] = {}
+        for result in results:
+            for word in {w for s in result['sentences'] for w in _words(s) if w not in _STOPWORDS}:
+                document_frequency[word] = document_frequency.get(word, 0) + 1
+        n = len(results)
+        
+        per_result = max(char_budget // n, 80)
+        distilled = []
+        for result in results:
+            scored = []
+            for position, sentence in enumerate(result['sentences']):
+                words = [w for w in _words(sentence) if w not in _STOPWORDS]
+                if not words:
+                    continue
+                informative = sum(math.log(1 + n / document_frequency.get(w, 1)) for w in set(words))
+                score = informative / math.sqrt(len(words))
+                score += 0.5 * len(query.intersection(words))
+                score += 0.3 if re.search(r"\d|\$", sentence) else 0.0  # prices, hours, ratings
+                score -= 0.05 * position  # earlier sentences tend to be the lede
+                scored.append((score, position, sentence))
+            
+            chosen, used = [], 0
+            for score, position, sentence in sorted(scored, reverse=True):
+                if used + len(sentence) + 1 > per_result:
+                    if not chosen:
+                        chosen.append((position, sentence[:per_result].rsplit(" ", 1)[0] + "…"))
+                    continue
+                chosen.append((position, sentence))
+                used += len(sentence) + 1
+            
+            distilled.append({
+                'title': result['title'],
+                'url': result['url'],
+                'content': " ".join(sentence for _, sentence in sorted(chosen))
+            })
+        return distilled
+
+# Singleton instance
+snippet_distiller = SnippetDistiller()
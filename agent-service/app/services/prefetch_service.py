@@ -0,0 +1,181 @@
+from app.config.settings import settings
+from app.models.compact import CompactPreferences
+from app.models.schemas import AgentRequest, BookingContext, TravelPreferences
+from app.repositories.plan_repository import plan_repository, plan_fingerprint
+from app.utils.cache import TTLCache
+from app.utils.deadline import deadline_after
+from app.services.usage_service import usage_tracker, BudgetExceededError, ALLOW
+from app.utils.metrics import metrics
+from app.utils.serialization import dumps
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Set inside prefetch tasks so the work they trigger is not mistaken for user demand
+speculative: ContextVar[bool] = ContextVar("speculative", default=False)
+
+@dataclass
+class _Prefetched:
+    search_key: Hashable
+    fingerprint: Optional[str]
+    expires_at: float
+
+class PrefetchService:
+    """Speculative background work started when a booking's details are viewed.
+    
+    A traveler who opens a booking usually asks for a plan next, so the searches
+    (and optionally a draft plan) for that booking are started at low priority:
+    only while completions have spare capacity, a few at a time, and cancelled
+    as soon as an interactive request has to wait. Search results and draft
+    plans are cached with a short TTL; a draft only reaches plan storage once
+    the traveler asks for exactly that plan. Each prefetch is scored when the booking's plan request
+    arrives (hit or miss) or when it expires unused.
+    """
+    
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._pending: Dict[int, _Prefetched] = {}
+        # Last preferences a traveler used, so prefetched searches match their next request
+        self._preferences = TTLCache(max_entries=settings.SEARCH_CACHE_MAX_ENTRIES)
+        # Draft plans by request fingerprint: (traveler id, plan JSON)
+        self._drafts = TTLCache(max_entries=settings.SEARCH_CACHE_MAX_ENTRIES)
+        metrics.register_gauge("prefetch", self.stats)
+    
+    def remember_preferences(self, traveler_id: Optional[int], preferences: TravelPreferences) -> None:
+        if traveler_id is not None and not speculative.get():
+            self._preferences.set(traveler_id, CompactPreferences(preferences), settings.PLAN_TTL_SECONDS)
+    
+    def schedule(self, booking: Dict[str, Any]) -> bool:
+        """Start prefetching for a booking unless disabled, already done or the service is busy"""
+        from app.services.agent_service import travel_agent_service
+        
+        if not settings.PREFETCH_ENABLED:
+            return False
+        self._expire()
+        booking_id = booking['id']
+        if booking_id in self._tasks or booking_id in self._pending:
+            return False
+        if len(self._tasks) >= settings.PREFETCH_MAX_INFLIGHT or not travel_agent_service.has_spare_capacity():
+            metrics.inc("prefetch_total", outcome="skipped")
+            return False
+        
+        remembered = self._preferences.get(booking.get('traveler_id'))
+        request = AgentRequest(
+            booking_context=BookingContext(
+                booking_id=booking_id,
+                location=f"{booking['city']}, {booking['state']}",
+                start_date=booking['start_date'],
+                end_date=booking['end_date'],
+                num_guests=booking['num_guests']
+            ),
+            preferences=remembered.to_model() if remembered else TravelPreferences(
+                budget=settings.PREFETCH_DEFAULT_BUDGET,
+                interests=[i.strip() for i in settings.PREFETCH_DEFAULT_INTERESTS.split(',') if i.strip()]
+            )
+        )
+        self._pending[booking_id] = _Prefetched(
+            search_key=travel_agent_service.search_key(request.booking_context.location, request.preferences),
+            fingerprint=None,
+            expires_at=time.monotonic() + settings.PREFETCH_TTL_SECONDS
+        )
+        task = asyncio.create_task(self._run(request, booking))
+        self._tasks[booking_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(booking_id, None))
+        metrics.inc("prefetch_total", outcome="started")
+        return True
+    
+    async def _run(self, request: AgentRequest, booking: Dict[str, Any]) -> None:
+        speculative.set(True)
+        booking_id = request.booking_context.booking_id
+        try:
+            # Background work gets its own budget, not what is left of the page view's
+            with deadline_after(settings.DEADLINE_DEFAULT_SECONDS), usage_tracker.track("prefetch", booking.get('traveler_id'), booking_id):
+                # Speculative spend is the first thing to go when a budget runs low
+                if usage_tracker.check_budget() != ALLOW:
+                    raise BudgetExceededError("prefetch", 0)
+                await self._prefetch(request, booking)
+            metrics.inc("prefetch_total", outcome="completed")
+        except BudgetExceededError:
+            self._pending.pop(booking_id, None)
+            metrics.inc("prefetch_total", outcome="skipped")
+        except asyncio.CancelledError:
+            self._pending.pop(booking_id, None)
+            metrics.inc("prefetch_total", outcome="cancelled")
+            raise
+        except Exception as e:
+            self._pending.pop(booking_id, None)
+            metrics.inc("prefetch_total", outcome="failed")
+            logger.error("Error prefetching booking %s: %s", booking_id, e)
+    
+    async def _prefetch(self, request: AgentRequest, booking: Dict[str, Any]) -> None:
+        from app.services.agent_service import travel_agent_service
+        
+        booking_context = request.booking_context
+        await asyncio.gather(
+            travel_agent_service._get_search_context(
+                booking_context.location, request.preferences, ttl=settings.PREFETCH_TTL_SECONDS
+            ),
+            travel_agent_service._get_weather(booking_context.location, booking_context.start_date, booking_context.end_date)
+        )
+        if settings.PREFETCH_DRAFT_PLAN:
+            fingerprint = plan_fingerprint(request)
+            if not await plan_repository.get_by_fingerprint(fingerprint):
+                plan = await travel_agent_service.generate_travel_plan(request, booking)
+                self._drafts.set(fingerprint, (booking.get('traveler_id'), dumps(plan)), settings.PREFETCH_TTL_SECONDS)
+            prefetched = self._pending.get(booking_context.booking_id)
+            if prefetched:
+                prefetched.fingerprint = fingerprint
+    
+    def take_draft(self, fingerprint: str) -> Optional[Tuple[Optional[int], bytes]]:
+        """Hand over the draft plan for a request, as (traveler id, plan JSON), if one was prefetched"""
+        return self._drafts.pop(fingerprint)
+    
+    def record_request(self, booking_id: int, search_key: Hashable, fingerprint: str) -> None:
+        """Score the prefetch for a booking against the plan request that followed it"""
+        if speculative.get():
+            return
+        self._expire()
+        prefetched = self._pending.pop(booking_id, None)
+        if prefetched is None:
+            return
+        if prefetched.fingerprint == fingerprint:
+            metrics.inc("prefetch_total", outcome="hit", kind="draft_plan")
+        elif prefetched.search_key == search_key:
+            metrics.inc("prefetch_total", outcome="hit", kind="search")
+        else:
+            metrics.inc("prefetch_total", outcome="miss")
+    
+    def yield_capacity(self) -> None:
+        """Cancel running prefetches so interactive work gets their slots"""
+        if speculative.get():
+            return
+        for task in list(self._tasks.values()):
+            task.cancel()
+    
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for booking_id in [b for b, p in self._pending.items() if p.expires_at <= now and b not in self._tasks]:
+            del self._pending[booking_id]
+            metrics.inc("prefetch_total", outcome="expired")
+    
+    def stats(self) -> Dict[str, float]:
+        self._expire()
+        count = lambda outcome: metrics.value("prefetch_total", outcome=outcome)
+        hits = sum(metrics.value("prefetch_total", outcome="hit", kind=kind) for kind in ("search", "draft_plan"))
+        started = count("started")
+        wasted = count("miss") + count("expired") + count("cancelled") + count("failed")
+        return {
+            "enabled": settings.PREFETCH_ENABLED,
+            "inflight": len(self._tasks),
+            "pending": len(self._pending),
+            "hit_rate": round(hits / started, 4) if started else 0.0,
+            "wasted_work_ratio": round(wasted / started, 4) if started else 0.0
+        }
+
+# Singleton instance
+prefetch_service = PrefetchService()
@@ -1,72 +1,161 @@
-from tavily import TavilyClient
 from app.config.settings import settings
-from typing import List, Dict, Any
+from app.services.usage_service import usage_tracker
+from typing import List, Dict, Any, Optional
+import hashlib
 import json
+import logging
+import re
+import requests
+import time
+
+logger = logging.getLogger(__name__)
+
+_UNSET = object()
+
+class FakeSearchClient:
+    """Deterministic offline stand-in for TavilyClient (SEARCH_PROVIDER=fake).
+    
+    Results depend only on the query, so load tests exercise distillation,
+    caching and weather parsing without live searches. SEARCH_FAKE_LATENCY_MS
+    simulates the round trip.
+    """
+    
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+    
+    def search(self, query: str, max_results: int = 5, **kwargs) -> Dict[str, Any]:
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        match = re.search(r"forecast (.+?) from| in (.+?) (?:2025|between)", query)
+        location = next((g for g in match.groups() if g), "the city") if match else "the city"
+        seed = int(hashlib.blake2b(query.encode("utf-8"), digest_size=2).hexdigest(), 16)
+        return {"results": [self._result(query, location, seed + i) for i in range(max_results)]}
+    
+    def _result(self, query: str, location: str, n: int) -> Dict[str, str]:
+        slug = re.sub(r"[^a-z0-9]+", "-", location.lower()).strip("-")
+        if query.startswith("Weather forecast"):
+            return {
+                'title': f"{location} weather outlook",
+                'url': f"https://weather.example.com/{slug}/{n % 7}",
+                'content': f"Partly cloudy in {location} with a high of {60 + n % 20}°F and a low of {45 + n % 10}°F."
+            }
+        kind = "Restaurant" if "restaurants" in query else "Attraction"
+        return {
+            'title': f"{kind} {n % 97} in {location}",
+            'url': f"https://search.example.com/{slug}/{kind.lower()}-{n % 97}",
+            'content': (
+                f"{kind} {n % 97} is one of the most popular places in {location}, rated {3 + n % 2}.{n % 10} by visitors. "
+                f"Open daily from {8 + n % 4} am, with prices around ${10 + n % 40} per person."
+            )
+        }
 
 class TavilySearchService:
     def __init__(self):
-        self.client = None
-        if settings.TAVILY_API_KEY:
-            try:
-                self.client = TavilyClient(api_key=settings.TAVILY_API_KEY)
-            except Exception as e:
-                print(f"Warning: Could not initialize Tavily client: {e}")
-                self.client = None
-    
-    def search_attractions(self, location: str, interests: List[str]) -> str:
-        """Search for attractions and activities in a location based on interests"""
+        self._client = _UNSET
+    
+    @property
+    def client(self):
+        """Tavily client, imported and built on first use; None when no API key is configured"""
+        if self._client is _UNSET:
+            self._client = None
+            if settings.SEARCH_PROVIDER.lower() == "fake":
+                self._client = FakeSearchClient(settings.SEARCH_FAKE_LATENCY_MS)
+            elif settings.TAVILY_API_KEY:
+                try:
+                    from tavily import TavilyClient
+                    self._client = TavilyClient(api_key=settings.TAVILY_API_KEY)
+                except Exception as e:
+                    logger.warning("Could not initialize Tavily client: %s", e)
+        return self._client
+    
+    @client.setter
+    def client(self, value):
+        self._client = value
+    
+    def search_attractions_raw(self, location: str, interests: List[str], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Search for attractions and return untruncated results for distillation"""
         if not self.client:
-            return "[]"
+            return []
         try:
             interests_str = ", ".join(interests)
             query = f"Best {interests_str} attractions and activities in {location} 2025"
             
-            response = self.client.search(
+            response = self._search(
                 query=query,
                 max_results=settings.MAX_SEARCH_RESULTS,
-                search_depth="advanced"
+                search_depth="advanced",
+                timeout=timeout
             )
             
-            # Format results for LLM consumption
-            results = []
-            for result in response.get('results', []):
-                results.append({
-                    'title': result.get('title', ''),
-                    'url': result.get('url', ''),
-                    'content': result.get('content', '')[:500]  # Limit content length
-                })
-            
-            return json.dumps(results, indent=2)
+            return self._results(response)
         except Exception as e:
-            print(f"Error searching attractions: {e}")
-            return "[]"
+            logger.error("Error searching attractions: %s", e)
+            return []
     
-    def search_restaurants(self, location: str, dietary_filters: List[str] = None) -> str:
-        """Search for restaurants in a location with dietary filters"""
+    def search_restaurants_raw(self, location: str, dietary_filters: List[str] = None, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Search for restaurants and return untruncated results for distillation"""
         if not self.client:
-            return "[]"
+            return []
         try:
             dietary_str = ", ".join(dietary_filters) if dietary_filters else "all cuisines"
             query = f"Best restaurants with {dietary_str} options in {location} 2025 reviews ratings"
             
-            response = self.client.search(
+            response = self._search(
                 query=query,
                 max_results=settings.MAX_SEARCH_RESULTS,
-                search_depth="advanced"
+                search_depth="advanced",
+                timeout=timeout
             )
             
-            results = []
-            for result in response.get('results', []):
-                results.append({
-                    'title': result.get('title', ''),
-                    'url': result.get('url', ''),
-                    'content': result.get('content', '')[:500]
-                })
-            
-            return json.dumps(results, indent=2)
+            return self._results(response)
         except Exception as e:
-            print(f"Error searching restaurants: {e}")
-            return "[]"
+            logger.error("Error searching restaurants: %s", e)
+            return []
+    
+    def search_attractions(self, location: str, interests: List[str], timeout: Optional[float] = None) -> str:
+        """Search for attractions and activities in a location based on interests"""
+        return self._format(self.search_attractions_raw(location, interests, timeout))
+    
+    def search_restaurants(self, location: str, dietary_filters: List[str] = None, timeout: Optional[float] = None) -> str:
+        """Search for restaurants in a location with dietary filters"""
+        return self._format(self.search_restaurants_raw(location, dietary_filters, timeout))
+    
+    def _search(self, timeout: Optional[float] = None, **kwargs) -> Dict[str, Any]:
+        """Run one search and account for it (advanced searches cost two credits).
+        
+        These calls run in worker threads, which asyncio.wait_for cannot stop, so
+        the caller's timeout has to reach the HTTP request itself.
+        """
+        if timeout is None or not hasattr(self.client, "base_url"):
+            response = self.client.search(**kwargs)
+        else:
+            # tavily-python 0.3.x posts with a fixed 100 s timeout; send the same request with ours
+            http_response = requests.post(
+                self.client.base_url,
+                json={"api_key": self.client.api_key, **kwargs},
+                headers={"Content-Type": "application/json"},
+                timeout=timeout
+            )
+            http_response.raise_for_status()
+            response = http_response.json()
+        usage_tracker.record_search(2 if kwargs.get("search_depth") == "advanced" else 1)
+        return response
+    
+    def _results(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {
+                'title': result.get('title', ''),
+                'url': result.get('url', ''),
+                'content': result.get('content', '')
+            }
+            for result in response.get('results', [])
+        ]
+    
+    def _format(self, results: List[Dict[str, Any]]) -> str:
+        """Format results for LLM consumption"""
+        return json.dumps([dict(r, content=r['content'][:500]) for r in results], indent=2)  # Limit content length
     
     def get_weather_forecast(self, location: str, start_date: str, end_date: str) -> str:
         """Get weather forecast for location and dates"""
@@ -75,7 +164,7 @@ class TavilySearchService:
         try:
             query = f"Weather forecast {location} from {start_date} to {end_date}"
             
-            response = self.client.search(
+            response = self._search(
                 query=query,
                 max_results=3,
                 search_depth="basic"
@@ -88,9 +177,28 @@ class TavilySearchService:
             
             return " ".join(weather_info)
         except Exception as e:
-            print(f"Error getting weather: {e}")
+            logger.error("Error getting weather: %s", e)
             return "Weather information unavailable"
     
+    def search_weather(self, location: str, start_date: str, end_date: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Run a raw weather search and return the unformatted results"""
+        if not self.client:
+            return []
+        try:
+            query = f"Weather forecast {location} from {start_date} to {end_date}"
+            
+            response = self._search(
+                query=query,
+                max_results=3,
+                search_depth="basic",
+                timeout=timeout
+            )
+            
+            return response.get('results', [])
+        except Exception as e:
+            logger.error("Error searching weather: %s", e)
+            return []
+    
     def search_local_events(self, location: str, start_date: str, end_date: str) -> str:
         """Search for local events during the travel dates"""
         if not self.client:
@@ -98,7 +206,7 @@ class TavilySearchService:
         try:
             query = f"Local events and festivals in {location} between {start_date} and {end_date}"
             
-            response = self.client.search(
+            response = self._search(
                 query=query,
                 max_results=5,
                 search_depth="advanced"
@@ -114,7 +222,7 @@ class TavilySearchService:
             
             return json.dumps(results, indent=2)
         except Exception as e:
-            print(f"Error searching events: {e}")
+            logger.error("Error searching events: %s", e)
             return "[]"
 
 # Singleton instance
@@ -0,0 +1,239 @@
+from app.config.settings import settings
+from app.utils.metrics import metrics
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, Iterator, Optional, Tuple
+import json
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALLOW = "allow"
+DOWNGRADE = "downgrade"
+REJECT = "reject"
+
+@dataclass
+class RequestUsage:
+    """Upstream usage of one request (or one booking of a batch)"""
+    request_id: str
+    route: str
+    user_id: Optional[int] = None
+    booking_id: Optional[int] = None
+    tenant: str = "default"
+    model: Optional[str] = None  # set when the budget downgrades the request
+    decision: str = ALLOW
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    completions: int = 0
+    search_calls: int = 0
+    search_credits: int = 0
+    cost_usd: float = 0.0
+    started_at: float = field(default_factory=time.time)
+
+@dataclass
+class UsageTotals:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    search_calls: int = 0
+    cost_usd: float = 0.0
+    
+    def add(self, usage: RequestUsage) -> None:
+        self.requests += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        self.search_calls += usage.search_calls
+        self.cost_usd += usage.cost_usd
+
+class BudgetExceededError(Exception):
+    """The user's or tenant's spend for the day is over budget"""
+    
+    def __init__(self, scope: str, retry_after: int):
+        super().__init__(f"{scope} budget exceeded")
+        self.scope = scope
+        self.retry_after = retry_after
+
+_current: ContextVar[Optional[RequestUsage]] = ContextVar("request_usage", default=None)
+
+class UsageTracker:
+    """Token, search and cost accounting with daily per-user and per-tenant budgets.
+    
+    Upstream calls record into the RequestUsage of the surrounding `track()`
+    block (a context variable, so it follows the request into tasks and worker
+    threads). Spend counts against the budgets as soon as it is recorded.
+    State is per process: with several replicas each pod enforces its own share.
+    """
+    
+    def __init__(self, max_keys: int = 10000, recent: int = 500):
+        self.max_keys = max_keys
+        self._totals: Dict[str, "OrderedDict[Hashable, UsageTotals]"] = {
+            "user": OrderedDict(), "booking": OrderedDict(), "tenant": OrderedDict()
+        }
+        self._daily_spend: Dict[Tuple[str, Hashable], float] = {}
+        self._day = datetime.utcnow().date()
+        self._recent: deque = deque(maxlen=recent)
+        self._pricing = self._load_pricing()
+        self._lock = threading.Lock()
+    
+    def _load_pricing(self) -> Dict[str, Tuple[float, float]]:
+        try:
+            return {model: tuple(prices) for model, prices in json.loads(settings.LLM_PRICING).items()}
+        except (ValueError, TypeError) as e:
+            logger.warning("Could not parse LLM_PRICING: %s", e)
+            return {}
+    
+    @contextmanager
+    def track(self, route: str, user_id: Optional[int] = None, booking_id: Optional[int] = None, tenant: Optional[str] = None, request_id: Optional[str] = None) -> Iterator[RequestUsage]:
+        usage = RequestUsage(
+            request_id=request_id or uuid.uuid4().hex[:16],
+            route=route,
+            user_id=user_id,
+            booking_id=booking_id,
+            tenant=tenant or "default"
+        )
+        token = _current.set(usage)
+        try:
+            yield usage
+        finally:
+            _current.reset(token)
+            self._finish(usage)
+    
+    def current(self) -> Optional[RequestUsage]:
+        return _current.get()
+    
+    def record_completion(self, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        prompt_price, completion_price = self._pricing.get(model, (0.0, 0.0))
+        cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+        metrics.inc("llm_tokens_total", prompt_tokens, model=model, kind="prompt")
+        metrics.inc("llm_tokens_total", completion_tokens, model=model, kind="completion")
+        metrics.inc("upstream_cost_usd_total", cost, upstream="llm")
+        usage = _current.get()
+        if usage is None:
+            return
+        usage.completions += 1
+        usage.prompt_tokens += prompt_tokens
+        usage.completion_tokens += completion_tokens
+        self._charge(usage, cost)
+    
+    def record_search(self, credits: int = 1) -> None:
+        cost = credits * settings.TAVILY_COST_PER_CREDIT
+        metrics.inc("search_calls_total", upstream="tavily")
+        metrics.inc("upstream_cost_usd_total", cost, upstream="tavily")
+        usage = _current.get()
+        if usage is None:
+            return
+        usage.search_calls += 1
+        usage.search_credits += credits
+        self._charge(usage, cost)
+    
+    def _charge(self, usage: RequestUsage, cost: float) -> None:
+        usage.cost_usd += cost
+        with self._lock:
+            self._roll_day()
+            for key in self._budget_keys(usage):
+                self._daily_spend[key] = self._daily_spend.get(key, 0.0) + cost
+    
+    def _budget_keys(self, usage: RequestUsage):
+        keys = [("tenant", usage.tenant)]
+        if usage.user_id is not None:
+            keys.append(("user", usage.user_id))
+        return keys
+    
+    def _roll_day(self) -> None:
+        today = datetime.utcnow().date()
+        if today != self._day:
+            self._day = today
+            self._daily_spend.clear()
+    
+    def check_budget(self, usage: Optional[RequestUsage] = None) -> str:
+        """Decide whether new upstream work may run for this request.
+        
+        Returns ALLOW or DOWNGRADE (and sets the cheaper model on the usage);
+        raises BudgetExceededError when a budget is used up.
+        """
+        usage = usage or _current.get()
+        if usage is None:
+            return ALLOW
+        decision = ALLOW
+        with self._lock:
+            self._roll_day()
+            for scope, key in self._budget_keys(usage):
+                budget = settings.BUDGET_USER_DAILY_USD if scope == "user" else settings.BUDGET_TENANT_DAILY_USD
+                if budget <= 0:
+                    continue
+                spent = self._daily_spend.get((scope, key), 0.0)
+                if spent >= budget:
+                    decision = REJECT
+                    break
+                if spent >= budget * settings.BUDGET_DOWNGRADE_FRACTION:
+                    decision = DOWNGRADE
+        usage.decision = decision
+        metrics.inc("budget_decisions_total", decision=decision)
+        if decision == REJECT:
+            raise BudgetExceededError(scope, self._seconds_until_reset())
+        if decision == DOWNGRADE and settings.LLM_DOWNGRADE_MODEL:
+            usage.model = settings.LLM_DOWNGRADE_MODEL
+        return decision
+    
+    def _seconds_until_reset(self) -> int:
+        now = datetime.utcnow()
+        return int((datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) - now).total_seconds()) + 1
+    
+    def _finish(self, usage: RequestUsage) -> None:
+        with self._lock:
+            for scope, key in (("user", usage.user_id), ("booking", usage.booking_id), ("tenant", usage.tenant)):
+                if key is None:
+                    continue
+                totals = self._totals[scope]
+                entry = totals.get(key)
+                if entry is None:
+                    entry = totals[key] = UsageTotals()
+                entry.add(usage)
+                totals.move_to_end(key)
+                while len(totals) > self.max_keys:
+                    totals.popitem(last=False)
+            self._recent.append(usage)
+    
+    def report(self, user_id: Optional[int] = None, booking_id: Optional[int] = None, tenant: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """Totals for the given user/booking/tenant (or the top spenders) plus recent requests"""
+        def top(scope):
+            entries = sorted(self._totals[scope].items(), key=lambda item: item[1].cost_usd, reverse=True)[:limit]
+            return [dict(asdict(totals), **{scope: key}) for key, totals in entries]
+        
+        def one(scope, key):
+            totals = self._totals[scope].get(key)
+            return dict(asdict(totals or UsageTotals()), **{scope: key})
+        
+        with self._lock:
+            recent = [
+                asdict(u) for u in reversed(self._recent)
+                if (user_id is None or u.user_id == user_id)
+                and (booking_id is None or u.booking_id == booking_id)
+                and (tenant is None or u.tenant == tenant)
+            ][:limit]
+            return {
+                "day": self._day.isoformat(),
+                "budgets": {
+                    "user_daily_usd": settings.BUDGET_USER_DAILY_USD,
+                    "tenant_daily_usd": settings.BUDGET_TENANT_DAILY_USD,
+                    "downgrade_fraction": settings.BUDGET_DOWNGRADE_FRACTION
+                },
+                "users": [one("user", user_id)] if user_id is not None else top("user"),
+                "bookings": [one("booking", booking_id)] if booking_id is not None else top("booking"),
+                "tenants": [one("tenant", tenant)] if tenant is not None else top("tenant"),
+                "daily_spend": [
+                    {"scope": scope, "key": key, "cost_usd": round(cost, 6)}
+                    for (scope, key), cost in sorted(self._daily_spend.items(), key=lambda item: item[1], reverse=True)
+                    if (user_id is None and tenant is None) or (scope, key) in (("user", user_id), ("tenant", tenant))
+                ][:limit],
+                "recent": recent
+            }
+
+# Singleton instance
+usage_tracker = UsageTracker()
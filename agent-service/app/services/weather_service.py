@@ -0,0 +1,173 @@
+from app.config.settings import settings
+from app.services.tavily_service import tavily_service
+from app.models.compact import CompactForecast
+from app.models.schemas import DayForecast
+from app.utils.cache import TTLCache
+from typing import Dict, List, Optional, Tuple
+from datetime import date, timedelta
+import re
+
+# Freshness rules: (max days until the date, cache TTL in seconds).
+# Forecasts for near dates change quickly, far dates are mostly seasonal outlooks.
+_FRESHNESS_RULES = (
+    (-1, 7 * 24 * 3600),   # already past: observed weather does not change
+    (2, 3600),             # next 48 hours
+    (7, 6 * 3600),         # this week
+    (14, 12 * 3600),       # within the forecast horizon
+)
+_OUTLOOK_TTL = 24 * 3600
+_UNAVAILABLE_TTL = 600
+
+_CONDITIONS = (
+    ("thunderstorms", ("thunderstorm", "thunder", "lightning")),
+    ("snow", ("snow", "sleet", "flurries", "blizzard")),
+    ("rain", ("rain", "showers", "drizzle", "downpour", "wet")),
+    ("fog", ("fog", "foggy", "mist", "haze")),
+    ("windy", ("windy", "gusts", "gusty")),
+    ("cloudy", ("cloudy", "overcast", "clouds", "grey", "gray")),
+    ("sunny", ("sunny", "sunshine", "clear", "sun", "dry")),
+)
+_CONDITION_RES = [
+    (name, re.compile(r"\b(?:" + "|".join(words) + r")\b", re.IGNORECASE))
+    for name, words in _CONDITIONS
+]
+_TEMP_RE = re.compile(r"(-?\d{1,3})\s*(?:°|º|deg(?:rees)?)\s*([FC])?\b", re.IGNORECASE)
+_SEGMENT_RE = re.compile(r"(?<=[.!?;|])\s+|\n+")
+
+def canonical_location(location: str) -> str:
+    """Normalize a free-text location so equivalent spellings share cache keys"""
+    cleaned = re.sub(r"[^\w\s,]", " ", location or "").casefold()
+    parts = [" ".join(part.split()) for part in cleaned.split(",")]
+    return ", ".join(part for part in parts if part)
+
+def _freshness_ttl(day: date, today: date) -> int:
+    days_until = (day - today).days
+    for limit, ttl in _FRESHNESS_RULES:
+        if days_until <= limit:
+            return ttl
+    return _OUTLOOK_TTL
+
+def _date_patterns(day: date) -> re.Pattern:
+    month_full = day.strftime("%B")
+    month_abbr = day.strftime("%b")
+    options = [
+        re.escape(day.isoformat()),
+        rf"{month_full}\.?\s+{day.day}(?:st|nd|rd|th)?(?!\d)",
+        rf"{month_abbr}\.?\s+{day.day}(?:st|nd|rd|th)?(?!\d)",
+        rf"(?<!\d){day.month}/{day.day}(?!\d)",
+    ]
+    return re.compile("|".join(options), re.IGNORECASE)
+
+def _extract(text: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """Pull a dominant condition and a high/low (°F) out of free text"""
+    best, best_count = "unknown", 0
+    for name, pattern in _CONDITION_RES:
+        count = len(pattern.findall(text))
+        if count > best_count:
+            best, best_count = name, count
+    
+    temps = []
+    celsius_only = "°c" in text.casefold() and "°f" not in text.casefold()
+    for value, unit in _TEMP_RE.findall(text):
+        temp = int(value)
+        if (unit or "").upper() == "C" or (not unit and celsius_only):
+            temp = round(temp * 9 / 5 + 32)
+        if -40 <= temp <= 130:
+            temps.append(temp)
+    
+    if not temps:
+        return best, None, None
+    high, low = max(temps), min(temps)
+    return best, high, (low if low != high else None)
+
+class WeatherForecastService:
+    """Per-day weather cache keyed by (canonical location, date).
+    
+    Trips are split into days and only the days missing from the cache are
+    looked up, one search per contiguous run of missing days, so overlapping
+    trips to the same city share results.
+    """
+    
+    def __init__(self):
+        self._cache = TTLCache(max_entries=settings.WEATHER_CACHE_MAX_ENTRIES)
+        self.searches = 0
+    
+    def get_forecast(self, location: str, start_date: date, end_date: date, timeout: Optional[float] = None) -> List[DayForecast]:
+        """Return one DayForecast per trip day, filling only uncached days.
+        
+        timeout bounds each search request, so a hung lookup does not hold its thread.
+        """
+        place = canonical_location(location)
+        days = [start_date + timedelta(days=i) for i in range(max((end_date - start_date).days, 1))]
+        cached = {
+            key: compact.to_model()
+            for key, compact in self._cache.get_many((place, day) for day in days).items()
+        }
+        
+        missing = [day for day in days if (place, day) not in cached]
+        for run in self._contiguous_runs(missing):
+            for forecast in self._lookup(location, place, run, timeout):
+                cached[(place, date.fromisoformat(forecast.date))] = forecast
+        
+        return [cached[(place, day)] for day in days]
+    
+    def format_forecast(self, forecasts: List[DayForecast]) -> str:
+        """Render forecasts as a compact one-line-per-day summary for prompts"""
+        if not forecasts or all(f.source == "unavailable" for f in forecasts):
+            return "Weather information unavailable"
+        lines = []
+        for f in forecasts:
+            if f.high_f is not None and f.low_f is not None:
+                temps = f", {f.low_f}-{f.high_f}°F"
+            elif f.high_f is not None:
+                temps = f", ~{f.high_f}°F"
+            else:
+                temps = ""
+            lines.append(f"{f.date}: {f.condition}{temps}")
+        return "; ".join(lines)
+    
+    def _contiguous_runs(self, days: List[date]) -> List[List[date]]:
+        runs: List[List[date]] = []
+        for day in sorted(days):
+            if runs and (day - runs[-1][-1]).days == 1:
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+        return runs
+    
+    def _lookup(self, location: str, place: str, run: List[date], timeout: Optional[float] = None) -> List[DayForecast]:
+        """Search once for a run of consecutive days and cache each day"""
+        if not tavily_service.client:
+            return [DayForecast(date=day.isoformat(), condition="unknown", source="unavailable") for day in run]
+        
+        self.searches += 1
+        results = tavily_service.search_weather(location, run[0].isoformat(), run[-1].isoformat(), timeout)
+        text = "\n".join(result.get('content', '') for result in results)
+        segments = [segment for segment in _SEGMENT_RE.split(text) if segment.strip()]
+        run_condition, run_high, run_low = _extract(text)
+        
+        today = date.today()
+        forecasts = []
+        for day in run:
+            pattern = _date_patterns(day)
+            day_text = " ".join(segment for segment in segments if pattern.search(segment))
+            condition, high, low = _extract(day_text) if day_text else ("unknown", None, None)
+            
+            if day_text and (condition != "unknown" or high is not None):
+                forecast = DayForecast(date=day.isoformat(), condition=condition, high_f=high, low_f=low, source="forecast")
+                ttl = _freshness_ttl(day, today)
+            elif text.strip():
+                forecast = DayForecast(date=day.isoformat(), condition=run_condition, high_f=run_high, low_f=run_low, source="outlook")
+                ttl = min(_freshness_ttl(day, today), _OUTLOOK_TTL)
+            else:
+                forecast = DayForecast(date=day.isoformat(), condition="unknown", source="unavailable")
+                ttl = _UNAVAILABLE_TTL
+            
+            # Cached as a slotted record; models are only built for the trips that read it
+            self._cache.set((place, day), CompactForecast.from_model(forecast), ttl)
+            forecasts.append(forecast)
+        
+        return forecasts
+
+# Singleton instance
+weather_service = WeatherForecastService()
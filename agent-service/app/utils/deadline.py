@@ -0,0 +1,67 @@
+"""
+Request-scoped deadlines.
+
+The deadline is an absolute monotonic time in a context variable, so it follows
+the request into tasks and worker threads. Stages ask for a timeout derived
+from what is left (optionally capped per stage) instead of using fixed values.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, Optional, TypeVar
+import asyncio
+import time
+
+T = TypeVar("T")
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before a stage could finish"""
+    
+    def __init__(self, stage: str = ""):
+        super().__init__(f"Deadline exceeded{f' during {stage}' if stage else ''}")
+        self.stage = stage
+
+@contextmanager
+def deadline_after(seconds: Optional[float]) -> Iterator[None]:
+    """Run the block with a deadline `seconds` from now (None removes any deadline)"""
+    token = _deadline.set(time.monotonic() + seconds if seconds is not None else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None when there is no deadline"""
+    deadline = _deadline.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+def timeout_for(stage: str = "", cap: Optional[float] = None) -> Optional[float]:
+    """Timeout for the next stage: the remaining budget, capped; raises once it is spent"""
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded(stage)
+    return min(left, cap) if cap else left
+
+async def bounded(awaitable: Awaitable[T], stage: str = "", cap: Optional[float] = None) -> T:
+    """Await with a timeout from the remaining budget.
+    
+    Raises DeadlineExceeded when the request budget is what ran out, and
+    asyncio.TimeoutError when only the stage cap did.
+    """
+    try:
+        timeout = timeout_for(stage, cap)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        left = remaining()
+        if left is not None and left <= 0.001:
+            raise DeadlineExceeded(stage) from None
+        raise
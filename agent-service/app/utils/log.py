@@ -0,0 +1,165 @@
+"""
+Non-blocking structured logging.
+
+Records are enqueued by a QueueHandler without being formatted and written as
+JSON lines by a QueueListener thread, so the event loop never waits on stdout.
+When the queue is full records are dropped (and counted) rather than blocking.
+Every record carries the current request id, route and stage timings; info
+logs of high-volume routes can be sampled per request via LOG_SAMPLE_RATES.
+Use lazy %-style arguments (logger.info("Plan for %s", booking_id)) so
+filtered-out records cost no formatting.
+"""
+
+from app.config.settings import settings
+from app.utils.metrics import metrics
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterator, Optional
+import atexit
+import copy
+import json
+import logging
+import orjson
+import queue
+import random
+import sys
+import time
+import uuid
+
+@dataclass
+class RequestContext:
+    request_id: str
+    route: str = ""
+    sampled: bool = True
+    started: float = field(default_factory=time.perf_counter)
+    stages: Dict[str, float] = field(default_factory=dict)
+
+_request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+# Record attributes set by logging itself; everything else passed via extra= is emitted
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "route", "stages"}
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+def current_request() -> Optional[RequestContext]:
+    return _request_context.get()
+
+def current_request_id() -> Optional[str]:
+    context = _request_context.get()
+    return context.request_id if context else None
+
+def _sample_rates() -> Dict[str, float]:
+    try:
+        return {route: float(rate) for route, rate in json.loads(settings.LOG_SAMPLE_RATES or "{}").items()}
+    except (ValueError, TypeError, AttributeError):
+        return {}
+
+_SAMPLE_RATES = _sample_rates()
+
+@contextmanager
+def request_context(route: str, request_id: Optional[str] = None) -> Iterator[RequestContext]:
+    """Bind a request id and route to every record logged inside the block"""
+    rate = _SAMPLE_RATES.get(route, 1.0)
+    context = RequestContext(request_id=request_id or new_request_id(), route=route, sampled=rate >= 1.0 or random.random() < rate)
+    token = _request_context.set(context)
+    try:
+        yield context
+    finally:
+        _request_context.reset(token)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage of the current request; timings are attached to later records"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        context = _request_context.get()
+        if context is not None:
+            context.stages[name] = round(context.stages.get(name, 0.0) + (time.perf_counter() - started) * 1000, 2)
+
+class ContextFilter(logging.Filter):
+    """Attach request context and drop info logs of unsampled requests"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request_context.get()
+        if context is None:
+            return True
+        if not context.sampled and record.levelno < logging.WARNING:
+            return False
+        record.request_id = context.request_id
+        record.route = context.route
+        record.stages = dict(context.stages) if context.stages else None
+        return True
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that neither formats on the caller's thread nor waits for queue space"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener formats; only copy so later mutation of the record cannot race it
+        return copy.copy(record)
+    
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total")
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key in ("request_id", "route", "stages"):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode("utf-8")
+
+_listener: Optional[QueueListener] = None
+
+def setup_logging() -> None:
+    """Route all logging (including uvicorn's) through the background queue; idempotent"""
+    global _listener
+    if _listener is not None:
+        return
+    
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    handler.addFilter(ContextFilter())
+    
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    # The request middleware writes its own access line with request id and timings
+    logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+    
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
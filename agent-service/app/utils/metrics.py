@@ -0,0 +1,40 @@
+from typing import Callable, Dict, Tuple
+import threading
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class MetricsRegistry:
+    """In-process counters and gauges, exposed as JSON on /api/metrics"""
+    
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+    
+    def value(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(_label_key(labels), 0)
+    
+    def register_gauge(self, name: str, fn: Callable[[], Dict[str, float]]) -> None:
+        """Register a callback computed at snapshot time, e.g. ratios or queue depths"""
+        self._gauges[name] = fn
+    
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+        gauges = {name: fn() for name, fn in self._gauges.items()}
+        return {"counters": counters, "gauges": gauges}
+
+# Singleton instance
+metrics = MetricsRegistry()
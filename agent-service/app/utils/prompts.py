@@ -1,4 +1,5 @@
-from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+# Prompt templates for LangChain-based callers. langchain is imported inside the
+# get_*_prompt helpers so importing this module never pulls it onto the hot path.
 
 SYSTEM_PROMPT = """You are an expert travel concierge AI assistant. Your role is to create personalized, detailed travel itineraries based on:
 - Booking details (dates, location, party size)
@@ -144,6 +145,8 @@ Return as a simple JSON array of strings:
 
 def get_itinerary_prompt():
     """Get the itinerary generation prompt template"""
+    from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+    
     return ChatPromptTemplate.from_messages([
         SystemMessagePromptTemplate.from_template(SYSTEM_PROMPT),
         HumanMessagePromptTemplate.from_template(ITINERARY_PROMPT_TEMPLATE)
@@ -151,6 +154,8 @@ def get_itinerary_prompt():
 
 def get_packing_prompt():
     """Get the packing list generation prompt template"""
+    from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+    
     return ChatPromptTemplate.from_messages([
         SystemMessagePromptTemplate.from_template(SYSTEM_PROMPT),
         HumanMessagePromptTemplate.from_template(PACKING_PROMPT_TEMPLATE)
@@ -158,6 +163,8 @@ def get_packing_prompt():
 
 def get_tips_prompt():
     """Get the travel tips generation prompt template"""
+    from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+    
     return ChatPromptTemplate.from_messages([
         SystemMessagePromptTemplate.from_template(SYSTEM_PROMPT),
         HumanMessagePromptTemplate.from_template(TIPS_PROMPT_TEMPLATE)
@@ -0,0 +1,74 @@
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+from app.models.schemas import (
+    AgentResponse, ItineraryPayload, PackingPayload, TipsPayload,
+    ActivitySlotPayload, RestaurantSlotPayload
+)
+from decimal import Decimal
+from typing import Any, Optional
+import hashlib
+import orjson
+
+# Validators are built once at import time; validate_json parses the completion
+# bytes in pydantic-core without an intermediate json.loads dict.
+ITINERARY_ADAPTER = TypeAdapter(ItineraryPayload)
+PACKING_ADAPTER = TypeAdapter(PackingPayload)
+TIPS_ADAPTER = TypeAdapter(TipsPayload)
+ACTIVITY_SLOT_ADAPTER = TypeAdapter(ActivitySlotPayload)
+RESTAURANT_SLOT_ADAPTER = TypeAdapter(RestaurantSlotPayload)
+AGENT_RESPONSE_ADAPTER = TypeAdapter(AgentResponse)
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """Serialize models with their compiled serializer and everything else with orjson"""
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class ORJSONModelResponse(JSONResponse):
+    """JSON response that skips jsonable_encoder and re-validation.
+    
+    Returning an instance from a route bypasses FastAPI's response_model
+    round-trip, so already validated models are serialized exactly once.
+    """
+    media_type = "application/json"
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the exact response bytes"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check If-None-Match against an ETag, ignoring the per-encoding suffix"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip().removeprefix("W/").strip('"')
+        for suffix in ("-br", "-gzip"):
+            candidate = candidate.removesuffix(suffix)
+        if candidate == bare:
+            return True
+    return False
+
+def conditional_response(request: Request, content: Any, etag: Optional[str] = None, cache_control: str = "private, no-cache") -> Response:
+    """Serialize content (unless already bytes) with an ETag and answer If-None-Match with 304"""
+    body = content if isinstance(content, bytes) else dumps(content)
+    etag = etag or make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
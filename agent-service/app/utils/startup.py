@@ -0,0 +1,51 @@
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import time
+
+class StartupProfile:
+    """Timings for import and warm-up, reported by /api/status"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imported_at = None
+        self.ready_at = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+    
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+    
+    def mark_imported(self) -> None:
+        self.imported_at = time.perf_counter()
+    
+    def mark_ready(self) -> None:
+        self.ready_at = time.perf_counter()
+    
+    def report(self) -> Dict[str, Any]:
+        def since_start(t):
+            return round(t - self.started, 3) if t is not None else None
+        return {
+            "ready": self.ready,
+            "import_seconds": since_start(self.imported_at),
+            "ready_seconds": since_start(self.ready_at),
+            "warmup": self.steps
+        }
+
+async def run_warmup(steps: Dict[str, Callable[[], Awaitable[Any]]], profile: StartupProfile, timeout: float) -> None:
+    """Run warm-up steps concurrently, each bounded by timeout; failures are recorded, not raised"""
+    async def run(name, step):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(step(), timeout=timeout)
+            status = "ok"
+        except asyncio.TimeoutError:
+            status = "timeout"
+        except Exception as e:
+            status = f"error: {e}"
+        profile.steps[name] = {"status": status, "seconds": round(time.perf_counter() - started, 3)}
+    
+    await asyncio.gather(*(run(name, step) for name, step in steps.items()))
+    profile.mark_ready()
+
+# Created when app.main starts importing, so import_seconds covers the whole app import
+startup_profile = StartupProfile()
@@ -0,0 +1,171 @@
+"""
+Adaptive per-upstream, per-operation timeouts.
+
+Each (upstream, operation) pair keeps a rolling window of observed latencies.
+Its timeout is a high percentile of that window times a safety multiplier,
+clamped to a floor and a ceiling, and never longer than the request's
+remaining deadline. Attempts that hit the adaptive timeout are recorded at
+it, so a degrading upstream pushes the timeout up (towards the ceiling)
+instead of cutting every call short; attempts cut by the deadline are not.
+"""
+
+from app.config.settings import settings
+from app.utils.deadline import DeadlineExceeded, remaining, timeout_for
+from app.utils.metrics import metrics
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+Key = Tuple[str, str]
+
+# (floor, ceiling) in seconds; UPSTREAM_TIMEOUT_BOUNDS overrides per "upstream.operation"
+_DEFAULT_BOUNDS: Dict[Key, Tuple[float, float]] = {
+    ("llm", "itinerary"): (10.0, settings.LLM_TIMEOUT_SECONDS),
+    ("llm", "packing"): (3.0, settings.LLM_TIMEOUT_SECONDS),
+    ("llm", "tips"): (3.0, settings.LLM_TIMEOUT_SECONDS),
+    ("llm", "edit"): (5.0, settings.LLM_TIMEOUT_SECONDS),
+    ("tavily", "search"): (2.0, settings.SEARCH_TIMEOUT_SECONDS),
+    ("tavily", "weather"): (1.0, settings.SEARCH_TIMEOUT_SECONDS),
+    ("db", "booking"): (0.25, settings.DB_TIMEOUT_SECONDS),
+    ("db", "bookings"): (1.0, settings.DB_TIMEOUT_SECONDS),
+}
+
+# Status codes worth another attempt; anything else is the caller's problem
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, "status_code", None) in _RETRYABLE_STATUS:
+        return True
+    # openai/groq SDK connection and timeout errors carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+class UpstreamTimeout(asyncio.TimeoutError):
+    """An upstream call ran past its adaptive timeout (and any retries)"""
+
+class AdaptiveTimeouts:
+    """Rolling latency percentiles per upstream operation, turned into timeouts"""
+    
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[Key, Deque[float]] = {}
+        self._cached: Dict[Key, float] = {}
+        self._bounds = dict(_DEFAULT_BOUNDS)
+        self._bounds.update(self._load_overrides())
+        self._lock = threading.Lock()
+        metrics.register_gauge("upstream_timeouts", self.stats)
+    
+    def _load_overrides(self) -> Dict[Key, Tuple[float, float]]:
+        try:
+            overrides = json.loads(settings.UPSTREAM_TIMEOUT_BOUNDS or "{}")
+            return {tuple(name.split(".", 1)): (float(floor), float(ceiling)) for name, (floor, ceiling) in overrides.items()}
+        except (ValueError, TypeError) as e:
+            logger.warning("Could not parse UPSTREAM_TIMEOUT_BOUNDS: %s", e)
+            return {}
+    
+    def bounds(self, upstream: str, op: str) -> Tuple[float, float]:
+        return self._bounds.get((upstream, op), (1.0, settings.LLM_TIMEOUT_SECONDS))
+    
+    def observe(self, upstream: str, op: str, seconds: float) -> None:
+        key = (upstream, op)
+        with self._lock:
+            samples = self._samples.setdefault(key, deque(maxlen=self.window))
+            samples.append(seconds)
+            self._cached.pop(key, None)
+    
+    def percentile(self, upstream: str, op: str, q: float) -> Optional[float]:
+        samples = self._samples.get((upstream, op))
+        if not samples or len(samples) < settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+    
+    def timeout(self, upstream: str, op: str) -> float:
+        """Current timeout for one attempt; the ceiling until enough samples exist"""
+        key = (upstream, op)
+        cached = self._cached.get(key)
+        if cached is not None:
+            return cached
+        floor, ceiling = self.bounds(upstream, op)
+        high = self.percentile(upstream, op, settings.ADAPTIVE_TIMEOUT_PERCENTILE)
+        value = ceiling if high is None else min(ceiling, max(floor, high * settings.ADAPTIVE_TIMEOUT_MULTIPLIER))
+        self._cached[key] = value
+        return value
+    
+    def _can_retry(self, upstream: str, op: str) -> bool:
+        """Retry only if a typical attempt still fits in the remaining deadline"""
+        left = remaining()
+        if left is None:
+            return True
+        typical = self.percentile(upstream, op, 50) or self.bounds(upstream, op)[0]
+        return left >= typical * 1.2
+    
+    async def call(self, upstream: str, op: str, attempt: Callable[[float], Awaitable[T]], retries: Optional[int] = None) -> T:
+        """Run attempt(timeout) under the adaptive timeout, retrying transient failures.
+        
+        Raises DeadlineExceeded once the request budget is gone, otherwise the
+        last attempt's error (UpstreamTimeout for a timed-out attempt).
+        """
+        retries = settings.UPSTREAM_MAX_RETRIES if retries is None else retries
+        stage = f"{upstream}.{op}"
+        for attempt_number in range(retries + 1):
+            adaptive = self.timeout(upstream, op)
+            timeout = timeout_for(stage, adaptive)
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(attempt(timeout), timeout)
+            except asyncio.TimeoutError:
+                # Censored sample: the call took at least this long. A cut made by the
+                # request deadline says nothing about the upstream, so it is not kept.
+                if timeout >= adaptive:
+                    self.observe(upstream, op, timeout)
+                metrics.inc("upstream_calls_total", upstream=upstream, op=op, outcome="timeout")
+                left = remaining()
+                if left is not None and left <= 0.001:
+                    raise DeadlineExceeded(stage) from None
+                error = UpstreamTimeout(f"{stage} timed out after {timeout:.1f}s")
+            except Exception as e:
+                metrics.inc("upstream_calls_total", upstream=upstream, op=op, outcome="error")
+                if not _retryable(e):
+                    raise
+                error = e
+            else:
+                self.observe(upstream, op, time.monotonic() - started)
+                metrics.inc("upstream_calls_total", upstream=upstream, op=op, outcome="ok")
+                return result
+            
+            if attempt_number == retries or not self._can_retry(upstream, op):
+                raise error
+            metrics.inc("upstream_retries_total", upstream=upstream, op=op)
+            logger.warning("Retrying %s after %s", stage, type(error).__name__)
+            await asyncio.sleep(random.uniform(0.05, 0.25) * (attempt_number + 1))
+        raise RuntimeError("unreachable")
+    
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        keys = set(self._bounds) | set(self._samples)
+        report = {}
+        for upstream, op in sorted(keys):
+            floor, ceiling = self.bounds(upstream, op)
+            p50 = self.percentile(upstream, op, 50)
+            high = self.percentile(upstream, op, settings.ADAPTIVE_TIMEOUT_PERCENTILE)
+            report[f"{upstream}.{op}"] = {
+                "timeout_s": round(self.timeout(upstream, op), 3),
+                "p50_s": round(p50, 3) if p50 is not None else None,
+                f"p{settings.ADAPTIVE_TIMEOUT_PERCENTILE:g}_s": round(high, 3) if high is not None else None,
+                "samples": len(self._samples.get((upstream, op), ())),
+                "floor_s": floor,
+                "ceiling_s": ceiling
+            }
+        return report
+
+# Singleton instance
+adaptive_timeouts = AdaptiveTimeouts(window=settings.ADAPTIVE_TIMEOUT_WINDOW)
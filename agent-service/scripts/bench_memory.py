@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: bytes retained per cached entry as Pydantic models vs the
+slotted records with interned strings that the weather and preference caches
+keep. Stored plans are not covered: they are cached as serialized JSON bytes.
+
+Usage (from agent-service/):
+    python scripts/bench_memory.py [--entries 2000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.models.compact import CompactForecast, CompactPreferences
+from app.models.schemas import DayForecast, TravelPreferences
+
+CONDITIONS = ["sunny", "cloudy", "rain", "fog", "windy", "unknown"]
+SOURCES = ["forecast", "outlook", "unavailable"]
+INTERESTS = ["museums", "food", "art", "nature", "history", "nightlife", "shopping", "beaches"]
+
+def forecast(n):
+    # A fresh date string per entry, as from isoformat() in the weather service
+    return DayForecast(
+        date=(date(2025, 11, 1) + timedelta(days=n % 60)).isoformat(),
+        condition=CONDITIONS[n % len(CONDITIONS)],
+        high_f=60 + n % 20,
+        low_f=45 + n % 10,
+        source=SOURCES[n % len(SOURCES)]
+    )
+
+def preferences(n):
+    return TravelPreferences.model_validate_json(
+        '{"budget": "medium", "interests": ["%s", "%s", "%s"], "dietary_filters": ["vegetarian"], "party_type": "couple"}'
+        % (INTERESTS[n % 8], INTERESTS[(n + 3) % 8], INTERESTS[(n + 5) % 8])
+    )
+
+def retained(build, entries):
+    """Average traced bytes still held per entry after building `entries` of them"""
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    kept = [build(n) for n in range(entries)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del kept
+    return used / entries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = [
+        ("weather day", forecast, lambda n: CompactForecast.from_model(forecast(n))),
+        ("preferences", preferences, lambda n: CompactPreferences(preferences(n))),
+    ]
+    print(f"{'entry':<16} {'model B':>10} {'compact B':>10} {'saved':>8}")
+    for name, as_model, as_compact in rows:
+        model = retained(as_model, args.entries)
+        compact = retained(as_compact, args.entries)
+        print(f"{name:<16} {model:>10.0f} {compact:>10.0f} {1 - compact / model:>7.0%}")
+
+if __name__ == '__main__':
+    main()
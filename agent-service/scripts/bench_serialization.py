@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: CPU per plan response for the old dict/encoder path vs the
+TypeAdapter + compiled-serializer path.
+
+Usage (from agent-service/):
+    python scripts/bench_serialization.py [--iterations 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fastapi.encoders import jsonable_encoder
+from app.models.schemas import AgentResponse, DayPlan, PackingItem
+from app.utils.serialization import ITINERARY_ADAPTER, PACKING_ADAPTER, TIPS_ADAPTER, dumps
+
+TAGS = ["museums", "food", "art", "nature", "history", "nightlife", "family", "outdoors"]
+CUISINES = ["Italian", "Mexican", "Japanese", "Californian", "Thai", "Vegan", "Seafood"]
+PRICE_TIERS = ["$", "$$", "$$$"]
+
+def activity(day, slot, i):
+    return {
+        "title": f"Day {day} {slot} activity {i}",
+        "address": f"{100 + i} Market Street, San Francisco, CA 94103",
+        "price_tier": PRICE_TIERS[(day + i) % 3],
+        "duration": "2-3 hours",
+        "tags": [TAGS[(day + i) % len(TAGS)], TAGS[(day + i + 3) % len(TAGS)]],
+        "wheelchair_accessible": (day + i) % 2 == 0,
+        "child_friendly": True,
+        "description": "A well-reviewed local favourite with plenty to see and do, popular with visitors in the afternoon.",
+        "url": f"https://example.com/venues/{day}-{slot}-{i}"
+    }
+
+def restaurant(day, i):
+    return {
+        "name": f"Restaurant {day}-{i}",
+        "cuisine": CUISINES[(day + i) % len(CUISINES)],
+        "address": f"{200 + i} Valencia Street, San Francisco, CA 94110",
+        "price_tier": PRICE_TIERS[i % 3],
+        "dietary_options": ["vegetarian", "vegan", "gluten-free"],
+        "rating": 4.5,
+        "url": f"https://example.com/restaurants/{day}-{i}"
+    }
+
+def completions(num_days):
+    days = [{
+        "day_number": d,
+        "date": f"2025-11-{d:02d}",
+        "morning": [activity(d, "morning", i) for i in range(2)],
+        "afternoon": [activity(d, "afternoon", i) for i in range(3)],
+        "evening": [activity(d, "evening", i) for i in range(2)],
+        "restaurants": [restaurant(d, i) for i in range(3)]
+    } for d in range(1, num_days + 1)]
+    items = [{"item": f"Item {i}", "reason": "Useful for the planned activities", "category": "clothing"} for i in range(20)]
+    tips = [f"Practical tip number {i} for getting around the city" for i in range(7)]
+    return json.dumps({"days": days}), json.dumps({"items": items}), json.dumps({"tips": tips})
+
+def old_path(raw_itinerary, raw_packing, raw_tips):
+    itinerary_data = json.loads(raw_itinerary)
+    itinerary = [
+        DayPlan(
+            day_number=d['day_number'], date=d['date'],
+            morning=d.get('morning', []), afternoon=d.get('afternoon', []),
+            evening=d.get('evening', []), restaurants=d.get('restaurants', [])
+        )
+        for d in itinerary_data.get('days', [])
+    ]
+    packing = [PackingItem(**item) for item in json.loads(raw_packing).get('items', [])]
+    tips = json.loads(raw_tips).get('tips', [])
+    plan = AgentResponse(itinerary=itinerary, packing_checklist=packing, weather_forecast="sunny", tips=tips)
+    # What FastAPI does with a returned model and response_model=AgentResponse
+    validated = AgentResponse.model_validate(plan.model_dump())
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def new_path(raw_itinerary, raw_packing, raw_tips):
+    plan = AgentResponse.model_construct(
+        itinerary=ITINERARY_ADAPTER.validate_json(raw_itinerary).days,
+        packing_checklist=PACKING_ADAPTER.validate_json(raw_packing).items,
+        weather_forecast="sunny",
+        weather_days=None,
+        total_estimated_cost=None,
+        tips=TIPS_ADAPTER.validate_json(raw_tips).tips
+    )
+    return dumps(plan)
+
+def cpu_per_call(fn, args, iterations):
+    fn(*args)
+    start = time.process_time()
+    for _ in range(iterations):
+        fn(*args)
+    return (time.process_time() - start) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    
+    print(f"{'days':>5} {'bytes':>8} {'old µs':>10} {'new µs':>10} {'speedup':>8}")
+    for num_days in (7, 14):
+        raws = completions(num_days)
+        assert json.loads(old_path(*raws)) == json.loads(new_path(*raws))
+        old = cpu_per_call(old_path, raws, args.iterations)
+        new = cpu_per_call(new_path, raws, args.iterations)
+        print(f"{num_days:>5} {len(new_path(*raws)):>8} {old:>10.0f} {new:>10.0f} {old / new:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Startup profile for agent-service: import-time breakdown (python -X importtime)
+and, optionally, the warm-up phase timings.
+
+Usage (from agent-service/):
+    python scripts/startup_profile.py [--top 20] [--warmup] [--output startup-profile.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# SDKs that should stay off the import path and load on first use
+LAZY_MODULES = ("groq", "openai", "tavily", "langchain")
+
+def import_profile():
+    """Run a fresh interpreter with -X importtime and return [(module, self_us, cumulative_us)]"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=AGENT_DIR, capture_output=True, text=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return modules
+
+def run_warmup():
+    sys.path.insert(0, AGENT_DIR)
+    from app.main import warm_up
+    from app.utils.startup import startup_profile
+    
+    asyncio.run(warm_up())
+    return startup_profile.report()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--top', type=int, default=20, help='Number of slowest modules to show')
+    parser.add_argument('--warmup', action='store_true', help='Also run the warm-up phase (needs DB/API access)')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+    
+    modules = import_profile()
+    total_us = next((cumulative for name, _, cumulative in modules if name == "app.main"), 0)
+    top_level = {}
+    for name, self_us, _ in modules:
+        root = name.split(".")[0]
+        top_level[root] = top_level.get(root, 0) + self_us
+    
+    print(f"Total import time for app.main: {total_us / 1000:.1f} ms\n")
+    print(f"{'package':<30} {'self ms':>10}")
+    for root, self_us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{root:<30} {self_us / 1000:>10.1f}")
+    
+    eager = sorted({root for root in top_level if root in LAZY_MODULES})
+    print(f"\nLazy SDKs imported at startup: {', '.join(eager) if eager else 'none'}")
+    
+    report = {
+        "import_ms": round(total_us / 1000, 1),
+        "packages_ms": {root: round(us / 1000, 1) for root, us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)},
+        "eager_lazy_sdks": eager
+    }
+    
+    if args.warmup:
+        report["warmup"] = run_warmup()
+        print("\nWarm-up:")
+        for name, step in report["warmup"]["warmup"].items():
+            print(f"  {name:<16} {step['status']:<20} {step['seconds']:.3f}s")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report saved: {args.output}")
+    
+    return 1 if eager else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Run from agent-service/ or the repository root: make the `app` package importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,94 @@
+"""End-to-end prewarm runs against the fake batch provider and an in-process store"""
+
+from datetime import date, timedelta
+import asyncio
+
+import pytest
+
+from app.jobs import prewarm as prewarm_job
+from app.jobs.prewarm import FakeBatchBackend, PrewarmState, prewarm
+from app.models.schemas import TravelPreferences
+from app.repositories.plan_repository import InMemoryPlanRepository
+
+PREFERENCES = TravelPreferences(budget="medium", interests=["food", "museums"])
+
+class DurableRepository(InMemoryPlanRepository):
+    """In-memory store standing in for MySQL/Mongo: it outlives each simulated run"""
+    persistent = True
+
+class Interrupted(Exception):
+    pass
+
+class InterruptingBackend(FakeBatchBackend):
+    """Fails its first poll, as if the job were killed while the batch was running"""
+
+    def __init__(self):
+        super().__init__(polls_until_done=1)
+        self.interrupt = True
+
+    async def poll(self, batch_id):
+        if self.interrupt:
+            self.interrupt = False
+            raise Interrupted()
+        return await super().poll(batch_id)
+
+@pytest.fixture
+def bookings(monkeypatch):
+    start = date.today() + timedelta(days=3)
+    details = {
+        booking_id: {
+            "id": booking_id, "city": city, "state": state, "traveler_id": 100 + booking_id,
+            "start_date": start, "end_date": start + timedelta(days=4), "num_guests": 2
+        }
+        for booking_id, city, state in ((1, "Austin", "TX"), (2, "Denver", "CO"))
+    }
+    monkeypatch.setattr(prewarm_job, "get_upcoming_booking_ids", lambda days_ahead, status: sorted(details))
+    monkeypatch.setattr(prewarm_job, "get_bookings_details", lambda ids: {i: details[i] for i in ids})
+    return details
+
+@pytest.fixture
+def repository(monkeypatch):
+    repository = DurableRepository()
+    monkeypatch.setattr(prewarm_job, "plan_repository", repository)
+    return repository
+
+def run(backend, state_file):
+    return asyncio.run(prewarm(7, PREFERENCES, backend, PrewarmState(str(state_file)), poll_interval=0))
+
+def test_stores_plans_and_skips_them_on_the_next_run(bookings, repository, tmp_path):
+    backend = FakeBatchBackend(polls_until_done=2)
+    first = run(backend, tmp_path / "state.json")
+    assert first == {"scanned": 2, "already_stored": 0, "generated": 2, "failed": 0}
+    for booking_id in bookings:
+        assert asyncio.run(repository.get_latest_for_booking(booking_id)) is not None
+
+    submitted = backend.submitted
+    second = run(backend, tmp_path / "state.json")
+    assert second == {"scanned": 2, "already_stored": 2, "generated": 0, "failed": 0}
+    assert backend.submitted == submitted
+
+def test_resumes_an_interrupted_batch_without_resubmitting(bookings, repository, tmp_path):
+    backend = InterruptingBackend()
+    with pytest.raises(Interrupted):
+        run(backend, tmp_path / "state.json")
+    submitted = backend.submitted
+    assert submitted > 0
+    assert all(asyncio.run(repository.get_latest_for_booking(b)) is None for b in bookings)
+
+    counts = run(backend, tmp_path / "state.json")
+    assert counts["generated"] == 2
+    assert backend.submitted == submitted
+
+def test_regenerates_plans_marked_done_but_missing_from_the_store(bookings, repository, tmp_path, monkeypatch):
+    run(FakeBatchBackend(), tmp_path / "state.json")
+
+    # Same state file, but the stored plans are gone (expired or wiped)
+    monkeypatch.setattr(prewarm_job, "plan_repository", DurableRepository())
+    counts = run(FakeBatchBackend(), tmp_path / "state.json")
+    assert counts == {"scanned": 2, "already_stored": 0, "generated": 2, "failed": 0}
+
+def test_refuses_a_store_that_does_not_persist(bookings, monkeypatch, tmp_path):
+    monkeypatch.setattr(prewarm_job, "plan_repository", InMemoryPlanRepository())
+    with pytest.raises(RuntimeError, match="does not persist"):
+        run(FakeBatchBackend(), tmp_path / "state.json")
+    assert not (tmp_path / "state.json").exists()